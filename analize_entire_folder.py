@@ -1,27 +1,144 @@
 import sys
 import os
-from facebook_chat_statistics import FacebookChatStatistics
+from facebook_chat_statistics import FacebookChatStatistics, shutdown_pdf_executor
+from user_statistics_store import UserStatisticsStore
+from message_database import MessageDatabase
+from inbox_statistics import reduce_inbox
+from report_manifest import ReportManifest
+from export_archive import ExportArchive, first_path, is_archive
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing.util
 import time
 
-def process_folder(folder_path, pdf=False, txt=False, user=None):
+def open_conversation(conversation, approximate=False):
+	fcs = FacebookChatStatistics(conversation, approximate)
+	# Titles of different conversations can be the same, so reports are named by their folders too
+	fcs.output_name = '{} ({})'.format(fcs.title, fcs.folder)
+	return fcs
+
+def process_folder(folder_path, pdf=False, txt=False, user=None, store=None, database=None, approximate=False, snapshot=False, manifest=None, force=False, html=False,
+				   transcript=False, chronological=False, compression=None):
 	if 'message_1.json' in os.listdir(folder_path):
 		try:
-			fcs = FacebookChatStatistics(folder_path + '/message_1.json')
-			fcs.run(pdf, txt, user)
+			if manifest is not None:
+				config = {'pdf': pdf, 'txt': txt, 'html': html, 'user': user, 'db': database is not None, 'approximate': approximate, 'snapshot': snapshot,
+						  'transcript': transcript, 'chronological': chronological, 'compression': compression}
+				inputs = manifest.fingerprint(folder_path)
+				if not force and manifest.is_current(folder_path, inputs, config):
+					print('{} Unchanged, skipped.'.format(os.path.basename(folder_path)))
+					return
+			fcs = open_conversation(folder_path + '/message_1.json', approximate)
+			if database is not None:
+				database.add_conversation(fcs)
+			outputs = fcs.run(pdf, txt, user, store, snapshot, transcript, html, chronological, compression)
+			if manifest is not None:
+				if database is not None:
+					outputs.append(database.path)
+				if store is not None:
+					outputs.append(store.path)
+				manifest.update(folder_path, inputs, config, outputs)
 		except Exception as e:
 			print('Error "{}" processing folder: {}'.format(e, folder_path))
 	else:
 		print('message_1.json not found in folder:', folder_path)
 
+def process_archive_conversation(parts, pdf=False, txt=False, user=None, db=False, approximate=False, snapshot=False, html=False,
+								 transcript=False, chronological=False, compression=None):
+	"""Processes a conversation read from an export archive in a worker process.
+
+	Every worker writes to its own connections of the SQLite databases.
+
+	Returns:
+		list: Paths of the written outputs, None if the conversation failed.
+
+	"""
+	store = UserStatisticsStore() if user is not None else None
+	database = MessageDatabase() if db else None
+	try:
+		fcs = open_conversation(parts, approximate)
+		if database is not None:
+			database.add_conversation(fcs)
+		outputs = fcs.run(pdf, txt, user, store, snapshot, transcript, html, chronological, compression)
+		if database is not None:
+			outputs.append(database.path)
+		if store is not None:
+			outputs.append(store.path)
+		return outputs
+	except Exception as e:
+		print('Error "{}" processing conversation: {}'.format(e, parts[0]))
+		return None
+	finally:
+		if database is not None:
+			database.close()
+		if store is not None:
+			store.close()
+
+def init_archive_worker():
+	# Worker processes wait for their child processes when exiting, so the PDF process
+	# reused by all conversations of the worker is stopped first, before its queues are closed
+	multiprocessing.util.Finalize(None, shutdown_pdf_executor, exitpriority=100)
+
+def process_archive(archive, pdf=False, txt=False, user=None, db=False, approximate=False, snapshot=False, manifest=None, force=False, html=False,
+					transcript=False, chronological=False, compression=None, max_workers=None):
+	"""Processes conversations of an export archive in parallel without extracting it.
+
+	Args:
+		archive (ExportArchive): Opened export.
+		max_workers (int): Number of processes, defaults to number of CPUs.
+
+	"""
+	config = {'pdf': pdf, 'txt': txt, 'html': html, 'user': user, 'db': db, 'approximate': approximate, 'snapshot': snapshot,
+			  'transcript': transcript, 'chronological': chronological, 'compression': compression}
+	futures = {}
+	with ProcessPoolExecutor(max_workers=max_workers, initializer=init_archive_worker) as executor:
+		for folder, parts in archive.conversations().items():
+			# Conversations are identified by the archive and their folder in it
+			key = os.path.join(os.path.abspath(first_path(archive.paths[0])), folder)
+			inputs = manifest.fingerprint_members(parts)
+			if not force and manifest.is_current(key, inputs, config):
+				print('{} Unchanged, skipped.'.format(os.path.basename(folder)))
+				continue
+			futures[executor.submit(process_archive_conversation, parts, pdf, txt, user, db, approximate, snapshot, html,
+									 transcript, chronological, compression)] = (key, inputs)
+
+		for i, future in enumerate(as_completed(futures), 1):
+			outputs = future.result()
+			if outputs is not None:
+				key, inputs = futures[future]
+				manifest.update(key, inputs, config, outputs)
+			if i % 100 == 0:
+				manifest.save()
+	manifest.save()
+
 def main():
-	pdf, txt = False, False
-	user = None
+	pdf, txt, html, db, inbox, approximate, snapshot, force = False, False, False, False, False, False, False, False
+	transcript, chronological = False, False
+	user, compression = None, None
 	if len(sys.argv) >= 2:
 		path_to_folder = str(sys.argv[1])
 		if 'pdf' in sys.argv:
 			pdf = True
 		if 'txt' in sys.argv:
 			txt = True
+		if 'html' in sys.argv:
+			html = True
+		if 'db' in sys.argv:
+			db = True
+		if 'inbox' in sys.argv[2:]:
+			inbox = True
+		if 'approx' in sys.argv:
+			approximate = True
+		if 'snapshot' in sys.argv:
+			snapshot = True
+		if '--force' in sys.argv:
+			force = True
+		if 'transcript' in sys.argv:
+			transcript = True
+		if 'chronological' in sys.argv:
+			chronological = True
+		for c in ['gzip', 'bz2', 'xz']:
+			if c in sys.argv:
+				compression = c
 		if 'user' in sys.argv:
 			try:
 				user = str(sys.argv[sys.argv.index('user') + 1]).replace('_', ' ')
@@ -31,23 +148,66 @@ def main():
 		
 	else:
 		print('Usage: python3 {} path/to/inbox'.format(sys.argv[0]))
+		print('   or: python3 {} path/to/export.zip (also .zip.001 or folder with all zip files of the export)'.format(sys.argv[0]))
 		print('Optional arguments:')
 		print('pdf - generate pdf report')
 		print('txt - generate txt report')
+		print('html - generate html report with svg charts (without matplotlib, much faster than pdf)')
+		print('db - export messages to SQLite database results/messages.db')
+		print('inbox - generate txt report of all conversations together')
+		print('approx - use bounded memory approximate word and character statistics')
+		print('snapshot - save computed statistics to results/snapshots for render_snapshots.py')
+		print('transcript - write messages to results/<title> (<folder>)_conversation.txt')
+		print('chronological - write transcript from the oldest message')
+		print('gzip, bz2 or xz - compress transcript')
+		print('--force - generate reports also for conversations unchanged since the last run')
 		print('user "user_name" - generate report for specific user, e.g. "user Jan_Kowalski"')
 		sys.exit()
 
-	if not os.path.isdir(path_to_folder):
+	# Conversations of an export archive are read without extracting it
+	archive = ExportArchive(path_to_folder) if is_archive(path_to_folder) else None
+	if archive is None and not os.path.isdir(path_to_folder):
 		print('Invalid folder path')
 		sys.exit()
 
-	folders = [f for f in os.listdir(path_to_folder) if os.path.isdir(os.path.join(path_to_folder, f))]
+	folders = [f for f in os.listdir(path_to_folder) if os.path.isdir(os.path.join(path_to_folder, f))] if archive is None else []
 
 	start_time = time.time()  # Start measuring time
 
-	for folder in folders:
+	store = UserStatisticsStore() if user is not None else None
+	database = MessageDatabase() if db and archive is None else None
+
+	if archive is not None and (not inbox or pdf or txt or html or db or snapshot or transcript or user is not None):
+		process_archive(archive, pdf, txt, user, db, approximate, snapshot, ReportManifest(), force, html, transcript, chronological, compression)
+	elif not inbox or pdf or txt or html or db or snapshot or transcript or user is not None:
+		manifest = ReportManifest()
+		for i, folder in enumerate(folders, 1):
 			folder_path = os.path.join(path_to_folder, folder)
-			process_folder(folder_path, pdf, txt, user)
+			process_folder(folder_path, pdf, txt, user, store, database, approximate, snapshot, manifest, force, html,
+						   transcript, chronological, compression)
+			if i % 100 == 0:
+				manifest.save()
+		manifest.save()
+
+	if database is not None:
+		database.close()
+
+	if store is not None:
+		store.export_json(user)
+		store.close()
+
+	if inbox:
+		if archive is not None:
+			paths = list(archive.conversations().values())
+		else:
+			paths = [os.path.join(path_to_folder, f, 'message_1.json') for f in folders]
+			paths = [path for path in paths if os.path.isfile(path)]
+		inbox_statistics = reduce_inbox(paths, approximate=approximate)
+		inbox_statistics.generate_txt()
+		print('Inbox statistics of {} conversations generated'.format(inbox_statistics.nbr_conversations))
+
+	if archive is not None:
+		archive.close()
 
 	end_time = time.time()  # Stop measuring time
 	execution_time = end_time - start_time
@@ -20,29 +20,35 @@ def combine_messages(output_dir):
     # Sort the files numerically based on the number after the underscore
     message_files.sort(key=lambda x: int(x.split('_')[1].split('.')[0]))
 
-    # Initialize an empty list to store combined messages
-    combined_messages = []
-
-    # Iterate over the message files and combine their messages
-    for filename in message_files:
-        file_path = os.path.join(raw_chats_dir, filename)
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            # Append the messages from the current file to the combined messages list
-            combined_messages.extend(data.get('messages', []))
-
-    # Load message_1.json as base file
-    base_file_path = os.path.join(raw_chats_dir, 'message_1.json')
-    with open(base_file_path, 'r', encoding='utf-8') as base_file:
-        base_data = json.load(base_file)
-
-    # Merge combined messages with the data from message_1.json
-    base_data['messages'] = combined_messages
-
-    # Write combined data to the output directory
+    # Messages are streamed part by part so only one file is kept in memory,
+    # header (everything except messages) is taken from the first file
+    encoder = json.JSONEncoder(ensure_ascii=True, separators=(',', ':'))
+    os.makedirs(output_dir, exist_ok=True)
     output_file = os.path.join(output_dir, 'message_1.json')
-    with open(output_file, 'w', encoding='utf-8') as file:
-        json.dump(base_data, file, ensure_ascii=True, indent=2)
+    with open(output_file, 'w', encoding='utf-8') as output:
+        first_message = True
+        for i, filename in enumerate(message_files):
+            file_path = os.path.join(raw_chats_dir, filename)
+            with open(file_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            messages = data.pop('messages', [])
+
+            if i == 0:
+                header = encoder.encode(data)
+                output.write(header[:-1])
+                if data:
+                    output.write(',')
+                output.write('"messages":[')
+
+            # Files are numbered from newest to oldest, so writing them in order keeps messages newest first
+            if messages:
+                if not first_message:
+                    output.write(',')
+                output.write(','.join(encoder.encode(message) for message in messages))
+                first_message = False
+            del data, messages
+
+        output.write(']}')
 
     # Print confirmation message
     print("Combined JSON Data successfully written to message_1.json")
@@ -0,0 +1,216 @@
+import io
+import os
+import re
+import threading
+import zipfile
+
+_shared_archives = {} # Archives opened by this process, reused by all conversations read from them
+
+class ExportArchive():
+    """Facebook data export read straight from its ZIP archives without extracting them.
+
+    Large exports are downloaded as several standalone archives and some
+    tools split an archive into volumes (export.zip.001, export.zip.002...),
+    all of them are read as one export. Members are decompressed while they
+    are read, nothing is written to disk.
+
+    Attributes:
+        paths (list): Archives of the export, every item is a path to a ZIP
+            file or a list of paths to volumes of one ZIP file.
+
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): ZIP file, its first volume (.001) or folder with
+                all archives of the export, or list of archives as `paths`.
+
+        """
+        self.paths = path if isinstance(path, list) else archive_paths(path)
+        self.__zip_files = None
+        self.__members = None
+        self.__lock = threading.Lock()
+
+    def __reduce__(self):
+        # Open archives can not be sent to other processes, every process opens them once
+        return (shared_archive, (self.paths,))
+
+    def zip_files(self):
+        """Returns opened ZipFile of every archive.
+        """
+        with self.__lock:
+            if self.__zip_files is None:
+                self.__zip_files = [zipfile.ZipFile(SplitFile(path) if isinstance(path, list) else path) for path in self.paths]
+            return self.__zip_files
+
+    def members(self):
+        """Returns (index of archive in `paths`, ZipInfo) of every member by its name.
+
+        The first archive wins if a name is in more of them.
+        """
+        if self.__members is None:
+            members = {}
+            for i, zip_file in enumerate(self.zip_files()):
+                for info in zip_file.infolist():
+                    members.setdefault(info.filename, (i, info))
+            self.__members = members
+        return self.__members
+
+    def open(self, name):
+        i, info = self.members()[name]
+        return self.zip_files()[i].open(info)
+
+    def conversations(self, category='inbox'):
+        """Finds conversations of `category` ('inbox', 'archived_threads'...).
+
+        Returns:
+            dict: Parts of every conversation (list of ArchiveMember, message_1.json
+                first) by the folder of the conversation in the archive.
+
+        """
+        pattern = re.compile(r'(.*(?:^|/)messages/' + re.escape(category) + r'/[^/]+)/message_(\d+)\.json')
+        parts = {}
+        for name in self.members():
+            match = pattern.fullmatch(name)
+            if match is not None:
+                parts.setdefault(match.group(1), {})[int(match.group(2))] = ArchiveMember(self, name)
+        return {folder: [numbers[n] for n in sorted(numbers)] for folder, numbers in sorted(parts.items()) if 1 in numbers}
+
+    def close(self):
+        with self.__lock:
+            if self.__zip_files is not None:
+                for zip_file in self.__zip_files:
+                    zip_file.close()
+            self.__zip_files = None
+            self.__members = None
+
+
+class ArchiveMember():
+    """Part of a conversation stored in an export archive, used in place of a path to message_N.json.
+
+    Attributes:
+        archive (ExportArchive): Archive containing the part.
+        name (str): Name of the member in the archive.
+
+    """
+
+    def __init__(self, archive, name):
+        self.archive = archive
+        self.name = name
+
+    def open(self):
+        return self.archive.open(self.name)
+
+    def info(self):
+        return self.archive.members()[self.name][1]
+
+    def __repr__(self):
+        return '{}:{}'.format(os.path.basename(first_path(self.archive.paths[self.archive.members()[self.name][0]])), self.name)
+
+
+class SplitFile(io.RawIOBase):
+    """Read-only seekable file made of consecutive volumes of one archive.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.sizes = [os.path.getsize(path) for path in paths]
+        self.offsets = [sum(self.sizes[:i]) for i in range(len(paths))]
+        self.size = sum(self.sizes)
+        self.__position = 0
+        self.__volume = None
+        self.__file = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.__position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.__position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError('Negative seek position {}'.format(offset))
+        self.__position = offset
+        return offset
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        read = 0
+        while read < len(view) and self.__position < self.size:
+            volume = max(i for i, offset in enumerate(self.offsets) if offset <= self.__position)
+            if volume != self.__volume:
+                if self.__file is not None:
+                    self.__file.close()
+                self.__file = open(self.paths[volume], 'rb')
+                self.__volume = volume
+            self.__file.seek(self.__position - self.offsets[volume])
+            n = self.__file.readinto(view[read:read + self.offsets[volume] + self.sizes[volume] - self.__position])
+            if not n:
+                break
+            read += n
+            self.__position += n
+        return read
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+        super().close()
+
+
+def shared_archive(paths):
+    """Returns the archive with `paths` opened by this process, opening it on first use.
+    """
+    key = repr(paths)
+    if key not in _shared_archives:
+        _shared_archives[key] = ExportArchive(paths)
+    return _shared_archives[key]
+
+def archive_paths(path):
+    """Returns archives of the export at `path`, volumes of one archive are grouped in a list.
+    """
+    if os.path.isdir(path):
+        names = sorted(os.listdir(path))
+        paths = [os.path.join(path, f) for f in names if f.lower().endswith('.zip')]
+        paths += [volumes(os.path.join(path, f)) for f in names if re.fullmatch(r'.*\.zip\.0*1', f, re.IGNORECASE)]
+        return paths
+    if re.fullmatch(r'.*\.0*1', path):
+        return [volumes(path)]
+    return [path]
+
+def volumes(first_volume):
+    """Returns paths to all volumes of an archive split into numbered files (.001, .002...).
+    """
+    base, number = re.fullmatch(r'(.*\.)(\d+)', first_volume).groups()
+    paths = []
+    i = int(number)
+    while os.path.isfile('{}{:0{}d}'.format(base, i, len(number))):
+        paths.append('{}{:0{}d}'.format(base, i, len(number)))
+        i += 1
+    return paths
+
+def first_path(path):
+    return path[0] if isinstance(path, list) else path
+
+def is_archive(path):
+    """Returns True if `path` is an export archive, its first volume or a folder with archives only.
+    """
+    if os.path.isfile(path):
+        return path.lower().endswith('.zip') or re.fullmatch(r'.*\.zip\.0*1', path, re.IGNORECASE) is not None
+    if os.path.isdir(path):
+        entries = [os.path.join(path, f) for f in os.listdir(path)]
+        return not any(os.path.isdir(entry) for entry in entries) and len(archive_paths(path)) > 0
+    return False
+
+def open_part(part):
+    """Opens a part of a conversation in binary mode, a path or an ArchiveMember.
+    """
+    return part.open() if hasattr(part, 'open') else open(part, 'rb')
@@ -4,38 +4,89 @@ import numpy as np
 from datetime import datetime
 import matplotlib.pyplot as plt
 from matplotlib.dates import DateFormatter
-import matplotlib.dates as mdates
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_pdf import PdfPages
 import warnings
-from facebook_messenger_conversation import FacebookMessengerConversation
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from facebook_messenger_conversation import FacebookMessengerConversation, top_with_rest
 from progress_bar import ProgressBar
-import json
+from user_statistics_store import UserStatisticsStore
+from html_report import generate_html
+from page_templates import PageTemplates, bin_means, percent_axis, plot_downsampled, style_axes, text_block, timeline_bins
 import time
 
 warnings.filterwarnings('ignore', module='matplotlib')
 
+_pdf_executor = None # Process rendering PDFs, reused by all conversations
+_page_templates = None # Figures of PDF pages, reused by all conversations
+
 class FacebookChatStatistics(FacebookMessengerConversation):
 
-    def __init__(self, path_to_conversation):
-        super().__init__(path_to_conversation, 10, 40, 10)
+    # Days above which timelines are aggregated to weeks or months and lines are downsampled
+    timeline_max_points = 1000
+    # DPI of rasterized timelines in PDF reports, None keeps them as vector graphics
+    rasterize_dpi = None
+
+    def __init__(self, path_to_conversation, approximate=False):
+        super().__init__(path_to_conversation, 10, 40, 10, approximate=approximate)
         self.max_participants_on_plots = 10
         self.pdf_fonts = ['Arial', 'Segoe UI Emoji']
 
 
-    def run(self, pdf=False, txt=False, user=None):
+    def run(self, pdf=False, txt=False, user=None, store=None, snapshot=False, transcript=False, html=False, chronological=False, compression=None):
+        """Generates the selected outputs concurrently and returns paths of the written files.
+
+        The PDF is rendered in a separate process from a snapshot of the
+        statistics while text outputs are written by a thread pool, so the
+        wall time is close to the PDF render time alone. `chronological` and
+        `compression` are options of the transcript (see `create_conversation_txt`).
+        """
+        outputs = []
         if len(self.p) == 0:
             print('{} No participants found in the conversation.'.format(self.title))
-            return
+            return outputs
         if self.nbr_msg < 10:
             print('{} Not enough messages to generate statistics.'.format(self.title))
-            return
+            return outputs
+        if not os.path.exists('results'):
+            os.makedirs('results')
+
+        futures = {}
+        start = time.time()
+        # The PDF process is started before any thread, forking a multithreaded process is unsafe
         if pdf:
-            self.generate_pdf()
-        if txt:
-            self.generate_txt()
-        if user != None:
-            self.update_user_statistics(user)
+            outputs.append(os.path.join('results', self.output_name + '.pdf'))
+            futures[pdf_executor().submit(render_pdf, type(self), self.snapshot_state())] = 'pdf'
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            if txt:
+                outputs.append(os.path.join('results', self.output_name + '.txt'))
+                futures[executor.submit(self.generate_txt)] = 'txt'
+            if html:
+                outputs.append(os.path.join('results', self.output_name + '.html'))
+                futures[executor.submit(self.generate_html)] = 'html'
+            if snapshot:
+                outputs.append(os.path.join('results', 'snapshots', self.output_name + '.snapshot'))
+                futures[executor.submit(self.save_snapshot, outputs[-1])] = 'snapshot'
+            if transcript:
+                futures[executor.submit(self.create_conversation_txt, chronological, compression)] = 'transcript'
+            # SQLite connection of the store can only be used by the thread that created it
+            if user != None:
+                self.update_user_statistics(user, store)
+
+            error = None
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                    if futures[future] == 'transcript':
+                        outputs.append(result)
+                    print('{} {} generated in {:.2f} seconds'.format(self.title, futures[future], time.time() - start))
+                except Exception as e:
+                    print('{} Error "{}" generating {}'.format(self.title, e, futures[future]))
+                    error = error or e
+        if error is not None:
+            raise error
         print('{} Succeeded!.'.format(self.title))
+        return outputs
 
     def print_in_terminal(self):
         print(banner('Times'))
@@ -126,8 +177,9 @@ class FacebookChatStatistics(FacebookMessengerConversation):
         print(get_stats(self.emojis_reactions_all_count, sum(self.emojis_reactions_all_count.values())))
         print('Top {} reactions emojis: {}'.format(self.nbr_top_emojis, list(self.top_reactions_emojis.keys())))
 
-    def generate_pdf(self, print_in_terminal=False):
-        pb = ProgressBar(27, prefix = self.title, suffix = 'Complete', length = 50)
+    def generate_pdf(self, print_in_terminal=False, path=None):
+        # PDF report, saved to `path` or results/<output_name>.pdf
+        pb = ProgressBar(29, prefix = self.title, suffix = 'Complete', length = 50)
         if not print_in_terminal: pb.off()
 
         # Set appropriate filename
@@ -138,18 +190,19 @@ class FacebookChatStatistics(FacebookMessengerConversation):
             for p in self.p:
                 names += p + ', '
             names = names[:-1]
-        filename = self.title + '.pdf'
+        filename = self.output_name + '.pdf'
 
         # Creating the results directory if it doesn't exist
-        if not os.path.exists('results'):
-            os.makedirs('results')
+        if path is None:
+            path = os.path.join('results', filename)
+            if not os.path.exists('results'):
+                os.makedirs('results')
 
-        with PdfPages(os.path.join('results', filename)) as pdf:
-            #participants_on_plots = participants[:max_participants_on_plots] + (['Rest'] if len(participants) > max_participants_on_plots else [])
-
-            figsize = {'pie' : (6.4, 4.8), 'bar' : (8.0, 4.8), 'text' : (8.27, 11.69)}
+        with PdfPages(path) as pdf:
             plt.rcParams['font.family'] = self.pdf_fonts
-            plt.rcParams['figure.figsize'] = figsize['pie']
+            templates = page_templates()
+            # Participants shown on plots and tables, the others are grouped as Rest
+            top_p = self.top_participants(self.max_participants_on_plots)
             colors = plt.cm.tab10(np.linspace(0, 1, 10))
 
             # Plot participants messages percentage
@@ -212,146 +265,118 @@ class FacebookChatStatistics(FacebookMessengerConversation):
                 create_pie_chart_with_rest('Editions', self.nbr_editions_p.values(), self.nbr_editions_p.keys(), self.max_participants_on_plots, pdf)
             pb.printProgressBar()
 
-            plt.rcParams['figure.figsize'] = figsize['bar']
+            # Long conversations are aggregated to weeks or months and lines are downsampled,
+            # so size and render time of the timelines do not grow with the history
+            starts, bin_name = timeline_bins(self.timeline, self.timeline_max_points)
+            bin_days = [self.timeline[i] for i in starts]
+            rasterized = self.rasterize_dpi is not None
+
             # Plot timeline
-            months = self.nbr_days/30
-            interval = int(round(months/12))
-            fmt = mdates.DateFormatter('%Y-%m-%d')
-            loc = mdates.MonthLocator(interval=interval)
-            ax = plt.axes()
-            ax.xaxis.set_major_formatter(fmt)
-            plt.bar(self.timeline, self.nbr_times_day, align='center')
-            plt.title('Timeline')
-            plt.ylabel('Number of messages')
-            ax.yaxis.grid(linestyle='--')
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            ax.spines['bottom'].set_linewidth(0.5)
-            ax.spines['left'].set_linewidth(0.5)
-            fig = plt.figure(1)
+            fig, ax = templates.page('bar')
+            ax.xaxis.set_major_formatter(DateFormatter('%Y-%m-%d'))
+            if bin_name == 'day':
+                ax.bar(self.timeline, self.nbr_times_day, align='center', rasterized=rasterized)
+                ax.set_ylabel('Number of messages')
+            else:
+                ax.bar(bin_days, bin_means(self.nbr_times_day, starts), width=np.diff(np.append(starts, self.nbr_days)), align='edge', rasterized=rasterized)
+                ax.set_ylabel('Messages per day ({}ly average)'.format(bin_name))
+            for i, window in enumerate(self.rolling_windows[:2], 1):
+                plot_downsampled(ax, self.timeline, self.get_rolling_window(window)['avg_msg_per_day'], self.timeline_max_points,
+                                 linewidth=1, color='C{}'.format(i), label='{}-day average'.format(window), rasterized=rasterized)
+            ax.legend(loc='upper right')
+            ax.set_title('Timeline')
+            style_axes(ax)
             fig.autofmt_xdate()
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
+            pdf.savefig(fig, dpi=self.rasterize_dpi)
             pb.printProgressBar()
 
             # Plot activity timeline
-            fmt = mdates.DateFormatter('%Y-%m-%d')
-            ax = plt.axes()
-            ax.xaxis.set_major_formatter(fmt)
-            plt.plot(self.timeline, self.activity_timeline)
-            plt.title('Active days timeline')
-            plt.ylabel('Percentage')
-            plt.ylim(top=1)
-            plt.yticks(plt.yticks()[0], ['{:,.0%}'.format(x) for x in plt.yticks()[0]])
-            ax.yaxis.grid(linestyle='--')
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            ax.spines['bottom'].set_linewidth(0.5)
-            ax.spines['left'].set_linewidth(0.5)
-            fig = plt.figure(1)
+            fig, ax = templates.page('bar')
+            ax.xaxis.set_major_formatter(DateFormatter('%Y-%m-%d'))
+            plot_downsampled(ax, self.timeline, self.activity_timeline, self.timeline_max_points, label='Since start', rasterized=rasterized)
+            for window in self.rolling_windows[1:]:
+                plot_downsampled(ax, self.timeline, self.get_rolling_window(window)['active_days_ratio'], self.timeline_max_points,
+                                 linewidth=1, label='Last {} days'.format(window), rasterized=rasterized)
+            ax.legend(loc='lower left')
+            ax.set_title('Active days timeline')
+            ax.set_ylabel('Percentage')
+            ax.set_ylim(top=1)
+            percent_axis(ax)
+            style_axes(ax)
             fig.autofmt_xdate()
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
+            pdf.savefig(fig, dpi=self.rasterize_dpi)
+            pb.printProgressBar()
+
+            # Plot participants share of messages in rolling window
+            if len(self.p) > 1:
+                window = self.rolling_windows[1]
+                shares, rest = self.get_rolling_share(window, top_p)
+                labels = top_p
+                if len(self.p) > len(top_p):
+                    shares = np.vstack((shares, rest))
+                    labels = top_p + ['Rest']
+                if bin_name != 'day':
+                    shares = bin_means(shares, starts)
+                fig, ax = templates.page('legend')
+                ax.set_prop_cycle('color', colors)
+                ax.xaxis.set_major_formatter(DateFormatter('%Y-%m-%d'))
+                ax.stackplot(self.timeline if bin_name == 'day' else bin_days, shares, labels=labels, rasterized=rasterized)
+                ax.set_title('Share of messages (last {} days)'.format(window))
+                ax.set_ylabel('Percentage')
+                ax.set_ylim(0, 1)
+                percent_axis(ax)
+                ax.legend(loc='upper right', bbox_to_anchor=(1.15, 1.15))
+                ax.spines['top'].set_visible(False)
+                ax.spines['right'].set_visible(False)
+                fig.autofmt_xdate()
+                pdf.savefig(fig, dpi=self.rasterize_dpi)
             pb.printProgressBar()
 
             # Plot by hour
-            hour = list(range(24))
-            plt.bar(hour, self.nbr_times_hour, align='center', width=0.8)
-            plt.title('Activity by Hour')
-            plt.xlabel('Hour of the day')
-            plt.ylabel('Number of messages')
-            plt.grid(True)
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
+            def hour_chart(ax):
+                bars = ax.bar(range(24), [0] * 24, align='center', width=0.8)
+                ax.set_title('Activity by Hour')
+                ax.set_xlabel('Hour of the day')
+                ax.set_ylabel('Number of messages')
+                ax.grid(True)
+                return bars
+            pdf.savefig(templates.fixed_bars('hour', self.nbr_times_hour, hour_chart))
             pb.printProgressBar()
 
             # Plot by weekday
             weekday_labels = ['Monday', 'Tuesday', 'Wednesday', 'Thursday',
                             'Friday', 'Saturday', 'Sunday']
             weekday_arr = np.arange(len(weekday_labels))
-            plt.bar(weekday_arr, self.nbr_times_weekday, align='center', width=0.8)
-            plt.xticks(weekday_arr, weekday_labels, rotation=30)
-            plt.title('Activity by Weekday')
-            plt.ylabel('Number of messages')
-            plt.grid(True)
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
+            def weekday_chart(ax):
+                bars = ax.bar(weekday_arr, [0] * len(weekday_arr), align='center', width=0.8)
+                ax.set_xticks(weekday_arr, weekday_labels, rotation=30)
+                ax.set_title('Activity by Weekday')
+                ax.set_ylabel('Number of messages')
+                ax.grid(True)
+                return bars
+            pdf.savefig(templates.fixed_bars('weekday', self.nbr_times_weekday, weekday_chart))
             pb.printProgressBar()
 
-
-            plt.gca().set_prop_cycle('color', colors)
-
-            # Plot reply times
-            # Plot reply times #2 is better
-            """intervals = [10, 30, 60, 300, 900, 3600, 43200, 86400, 864000]
-            intervals_labels = ['0s-10s', '10s-30s', '30s-1min', '1min-5min', '5min-15min', '15min-1h', '1h-12h', '12h-1day', '>1day']
-            j = 0
-            val = {}
-            x = np.arange(len(intervals))
-            if len(self.p) <= self.max_participants_on_plots:
-                bar_width = 0.8 / len(self.p)  # Calculate the width of each bar
-                for k, p in enumerate(self.p):
-                    j = 0
-                    # Calculate the x values for the current participant
-                    x_offset = k * bar_width - (0.4 - bar_width / 2)
-                    val.update({p : [0 for i in intervals]})
-                    for i in reversed(self.reply_times_p[p]):
-                        if i > intervals[j] and j < len(intervals) - 1:
-                            j += 1
-                        val[p][j] += 1
-                    #plt.bar(x + x_offset, val[p], align='center', width=bar_width, label=p)
-                    plt.plot(x, val[p], label=p)
-                plt.legend(self.p,
-                        loc='upper right',
-                        bbox_to_anchor=(1.15, 1.15))
-            else:
-                val = [0 for i in intervals]
-                for i in reversed(self.reply_times):
-                    if i > intervals[j] and j < len(intervals) - 1:
-                        j += 1
-                    val[j] += 1
-                plt.bar(x, val, align='center', width=0.8)
-
-            plt.xticks(x, intervals_labels, rotation=10)
-            plt.title('Reply times')
-            plt.ylabel('Number of messages')
-            plt.grid(True)
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
+            # Plot participants activity by weekday and hour
+            p_index = {p: i for i, p in enumerate(self.p)}
+            nbr_rows = (len(top_p) + 1) // 2
+            fig = Figure(figsize=(templates.figsize['text'][0], min(2.2 * nbr_rows + 1, templates.figsize['text'][1])))
+            axes = fig.subplots(nbr_rows, 2 if len(top_p) > 1 else 1, squeeze=False)
+            for ax in axes.flat[len(top_p):]:
+                ax.axis('off')
+            for ax, p in zip(axes.flat, top_p):
+                ax.imshow(self.activity_tensor[p_index[p]], aspect='auto', cmap='Blues')
+                ax.set_title(p, fontsize=10)
+                ax.set_yticks(weekday_arr)
+                ax.set_yticklabels([label[:3] for label in weekday_labels], fontsize=8)
+                ax.set_xticks(range(0, 24, 3))
+                ax.set_xticklabels(range(0, 24, 3), fontsize=8)
+            fig.suptitle('Activity by Weekday and Hour')
+            fig.tight_layout()
+            pdf.savefig(fig)
             pb.printProgressBar()
 
-            # Plot reply times (participant percentage share)
-            if len(self.p) <= self.max_participants_on_plots:
-                val_sum = [0 for i in intervals]
-                for p in self.p:
-                    for i in range(len(intervals)):
-                        val_sum[i] += val[p][i]
-
-                for k, p in enumerate(self.p):
-                    # Calculate the x values for the current participant
-                    x_offset = k * bar_width - (0.4 - bar_width / 2)
-                    v = [x / val_sum[k] if val_sum[k] != 0 else 0 for k, x in enumerate(val[p])]
-                    #plt.bar(x + x_offset, v, align='center', width=bar_width, label=p)
-                    plt.plot(x, v, label=p)
-
-                plt.legend(self.p, loc='upper right', bbox_to_anchor=(1.15, 1.15))
-                plt.xticks(x, intervals_labels, rotation=10)
-                plt.title('Reply times')
-                plt.ylabel('Percentage of messages')
-                plt.yticks(plt.yticks()[0], ['{:,.0%}'.format(x) for x in plt.yticks()[0]])
-                plt.grid(True)
-                plt.tight_layout()
-                pdf.savefig()
-                plt.close()
-            pb.printProgressBar()"""
-
-
-            # Plot reply times #2
+            # Plot reply times
             intervals = [1.0 * (1.294 ** i) for i in range(45)]
             def custom_ftm(x, pos):
                 h = x // 3600
@@ -362,69 +387,38 @@ class FacebookChatStatistics(FacebookMessengerConversation):
                         return '{:2.0f}s'.format(s)
                     return '{:2.0f}min'.format(x // 60)
                 return '{:2.0f}h'.format(x // 3600)
-            
+
             j = 0
             val = {}
             x = np.arange(len(intervals))
             if len(self.p) <= self.max_participants_on_plots:
-                bar_width = 0.8 / len(self.p)  # Calculate the width of each bar
+                fig, ax = templates.page('legend')
+                ax.set_prop_cycle('color', colors)
                 for k, p in enumerate(self.p):
                     j = 0
-                    # Calculate the x values for the current participant
-                    #x_offset = k * bar_width - (0.4 - bar_width / 2)
                     val.update({p : [0 for i in intervals]})
                     for i in reversed(self.reply_times_p[p]):
                         if i > intervals[j] and j < len(intervals) - 1:
                             j += 1
                         val[p][j] += 1
-                    #plt.bar(x + x_offset, val[p], align='center', width=bar_width, label=p)
-                    plt.plot(x, val[p], label=p)
-                plt.legend(self.p, loc='upper right', bbox_to_anchor=(1.15, 1.15))
+                    ax.plot(x, val[p], label=p)
+                ax.legend(self.p, loc='upper right', bbox_to_anchor=(1.15, 1.15))
             else:
+                fig, ax = templates.page('bar')
+                ax.set_prop_cycle('color', colors)
                 val = [0 for i in intervals]
                 for i in reversed(self.reply_times):
                     if i > intervals[j] and j < len(intervals) - 1:
                         j += 1
                     val[j] += 1
-                #plt.bar(x, val, align='center', width=0.8)
-                plt.plot(x, val)
-
-            #plt.xticks(x, intervals_labels, rotation=10)
-            plt.xticks([i for i in range(0, len(intervals), 4)], [custom_ftm(i, 0) for i in intervals[::4]])
-            plt.title('Reply times')
-            plt.ylabel('Number of messages')
-            plt.grid(True)
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
-            pb.printProgressBar()
-
-            # Plot reply times (participant percentage share)
-            # Not necessary, previous plot is enough
-            """if len(self.p) <= self.max_participants_on_plots and self.nbr_msg > 1000:
-                val_sum = [0 for i in intervals]
-                for p in self.p:
-                    for i in range(len(intervals)):
-                        val_sum[i] += val[p][i]
-
-                for k, p in enumerate(self.p):
-                    # Calculate the x values for the current participant
-                    #x_offset = k * bar_width - (0.4 - bar_width / 2)
-                    v = [x / val_sum[k] if val_sum[k] != 0 else 0 for k, x in enumerate(val[p])]
-                    #plt.bar(x + x_offset, v, align='center', width=bar_width, label=p)
-                    plt.plot(x, v, label=p)
-
-                plt.legend(self.p, loc='upper right', bbox_to_anchor=(1.15, 1.15))
-                #plt.xticks(x, intervals_labels, rotation=10)
-                plt.xticks([i for i in range(0, len(intervals), 4)], [custom_ftm(i, 0) for i in intervals[::4]])
-                plt.title('Reply times')
-                plt.ylabel('Percentage of messages')
-                plt.yticks(plt.yticks()[0], ['{:,.0%}'.format(x) for x in plt.yticks()[0]])
-                plt.grid(True)
-                plt.tight_layout()
-                pdf.savefig()
-                plt.close()"""
+                ax.plot(x, val)
 
+            ax.set_xticks([i for i in range(0, len(intervals), 4)], [custom_ftm(i, 0) for i in intervals[::4]])
+            ax.set_title('Reply times')
+            ax.set_ylabel('Number of messages')
+            ax.grid(True)
+            pdf.savefig(fig)
+            pb.printProgressBar()
 
             # Plot messages per day
             intervals = [0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 100000]
@@ -442,40 +436,36 @@ class FacebookChatStatistics(FacebookMessengerConversation):
             val.pop(0)
             intervals_labels.pop(0)
             x = np.arange(len(val))
-            plt.bar(x, val, align='center', width=0.8)
-            plt.xticks(x, intervals_labels, rotation=0)
-            plt.title('Days per number of messages')
-            plt.ylabel('Number of days')
-            plt.xlabel('Number of messages')
-            plt.grid(True)
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
+            fig, ax = templates.page('bar')
+            ax.bar(x, val, align='center', width=0.8)
+            ax.set_xticks(x, intervals_labels, rotation=0)
+            ax.set_title('Days per number of messages')
+            ax.set_ylabel('Number of days')
+            ax.set_xlabel('Number of messages')
+            ax.grid(True)
+            pdf.savefig(fig)
             pb.printProgressBar()
 
             # Plot number of messages in a row
-            plt.gca().set_prop_cycle('color', colors)
             if len(self.p) <= self.max_participants_on_plots:
+                fig, ax = templates.page('legend')
+                ax.set_prop_cycle('color', colors)
                 intervals_labels = [str(i) for i in self.nbr_msg_in_row_p[self.p[0]].keys()]
                 bar_width = 0.8 / len(self.p)  # Calculate the width of each bar
                 x = np.arange(len(intervals_labels))
                 for k, p in enumerate(self.p):
-                    j = 0
                     # Calculate the x values for the current participant
                     x_offset = k * bar_width - (0.4 - bar_width / 2)
-                    plt.bar(x + x_offset, self.nbr_msg_in_row_p[p].values(), align='center', width=bar_width, label=p)
-                plt.legend(self.p,
+                    ax.bar(x + x_offset, self.nbr_msg_in_row_p[p].values(), align='center', width=bar_width, label=p)
+                ax.legend(self.p,
                         loc='upper right',
                         bbox_to_anchor=(1.15, 1.15))
-                plt.xticks(x, intervals_labels, rotation=0)
-                plt.title('Messages in a row')
-                plt.xlabel('Number of messages in a row')
-                plt.ylabel('Count')
-                #plt.yscale('log')
-                plt.grid(True)
-                plt.tight_layout()
-                pdf.savefig()
-                plt.close()
+                ax.set_xticks(x, intervals_labels, rotation=0)
+                ax.set_title('Messages in a row')
+                ax.set_xlabel('Number of messages in a row')
+                ax.set_ylabel('Count')
+                ax.grid(True)
+                pdf.savefig(fig)
             pb.printProgressBar()
 
             # Plot number of messages in a row (participant percentage share)
@@ -485,98 +475,56 @@ class FacebookChatStatistics(FacebookMessengerConversation):
                     for i, elem in enumerate(self.nbr_msg_in_row_p[p].values()):
                         val_sum[i] += elem
 
+                fig, ax = templates.page('legend')
+                ax.set_prop_cycle('color', colors)
                 for k, p in enumerate(self.p):
                     # Calculate the x values for the current participant
                     x_offset = k * bar_width - (0.4 - bar_width / 2)
                     v = [x / val_sum[k] if val_sum[k] != 0 else 0 for k, x in enumerate(self.nbr_msg_in_row_p[p].values())]
-                    plt.bar(x + x_offset, v, align='center', width=bar_width, label=p)
-
-                plt.legend(self.p, loc='upper right', bbox_to_anchor=(1.15, 1.15))
-                plt.xticks(x, intervals_labels, rotation=10)
-                plt.title('Messages in a row')
-                plt.xlabel('Number of messages in a row')
-                plt.ylabel('Percentage')
-                plt.yticks(plt.yticks()[0], ['{:,.0%}'.format(x) for x in plt.yticks()[0]])
-                plt.grid(True)
-                plt.tight_layout()
-                pdf.savefig()
-                plt.close()
-            pb.printProgressBar()
-
-            # Plot top emojis
-            plt.gca().set_prop_cycle('color', colors)
-
-            x = np.arange(len(self.top_emojis))
-            if len(self.p) <= self.max_participants_on_plots:
-                bar_width = 0.8 / len(self.p)  # Calculate the width of each bar
-        
-                for i, participant in enumerate(self.emojis_all_count.keys()):
-                    # Calculate the x values for the current participant
-                    x_offset = i * bar_width - (0.4 - bar_width / 2)
-                    plt.bar(x + x_offset, [self.top_emojis[emoji_key][participant] for emoji_key in self.top_emojis], align='center', width=bar_width, label=participant)
-                plt.legend(self.emojis_all_count.keys(),
-                        loc='upper right',
-                        bbox_to_anchor=(1.15, 1.15))
-            else:
-                plt.bar(x, [self.top_emojis[emoji_key]['all'] for emoji_key in self.top_emojis], align='center')
-
-            plt.xticks(x, self.top_emojis.keys())
-            plt.title('Top {} emojis'.format(self.nbr_top_emojis))
-            plt.ylabel('Number of times used')
-            ax = plt.gca()  # Get the current Axes instance
-            ax.yaxis.grid(linestyle='--')
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            ax.spines['bottom'].set_linewidth(0.5)
-            ax.spines['left'].set_linewidth(0.5)
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
+                    ax.bar(x + x_offset, v, align='center', width=bar_width, label=p)
+
+                ax.legend(self.p, loc='upper right', bbox_to_anchor=(1.15, 1.15))
+                ax.set_xticks(x, intervals_labels, rotation=10)
+                ax.set_title('Messages in a row')
+                ax.set_xlabel('Number of messages in a row')
+                ax.set_ylabel('Percentage')
+                percent_axis(ax)
+                ax.grid(True)
+                pdf.savefig(fig)
             pb.printProgressBar()
 
-            # Plot top reactions emojis
-            plt.gca().set_prop_cycle('color', colors)
+            # Plot top emojis and top reactions emojis
+            for title, top_emojis, emojis_all_count in [('Top {} emojis'.format(self.nbr_top_emojis), self.top_emojis, self.emojis_all_count),
+                                                        ('Top {} reactions emojis'.format(self.nbr_top_emojis), self.top_reactions_emojis, self.emojis_reactions_all_count)]:
+                x = np.arange(len(top_emojis))
+                if len(self.p) <= self.max_participants_on_plots:
+                    fig, ax = templates.page('legend')
+                    ax.set_prop_cycle('color', colors)
+                    bar_width = 0.8 / len(self.p)  # Calculate the width of each bar
+                    for i, participant in enumerate(emojis_all_count.keys()):
+                        # Calculate the x values for the current participant
+                        x_offset = i * bar_width - (0.4 - bar_width / 2)
+                        ax.bar(x + x_offset, [top_emojis[emoji_key][participant] for emoji_key in top_emojis], align='center', width=bar_width, label=participant)
+                    ax.legend(emojis_all_count.keys(),
+                            loc='upper right',
+                            bbox_to_anchor=(1.15, 1.15))
+                else:
+                    fig, ax = templates.page('bar')
+                    ax.set_prop_cycle('color', colors)
+                    ax.bar(x, [top_emojis[emoji_key]['all'] for emoji_key in top_emojis], align='center')
+
+                ax.set_xticks(x, top_emojis.keys())
+                ax.set_title(title)
+                ax.set_ylabel('Number of times used')
+                style_axes(ax)
+                pdf.savefig(fig)
+                pb.printProgressBar()
 
-            x = np.arange(len(self.top_reactions_emojis))
-            if len(self.p) <= self.max_participants_on_plots:
-                bar_width = 0.8 / len(self.p)  # Calculate the width of each bar
-        
-                for i, participant in enumerate(self.emojis_reactions_all_count.keys()):
-                    # Calculate the x values for the current participant
-                    x_offset = i * bar_width - (0.4 - bar_width / 2)
-                    plt.bar(x + x_offset, [self.top_reactions_emojis[emoji_key][participant] for emoji_key in self.top_reactions_emojis], align='center', width=bar_width, label=participant)
-                plt.legend(self.emojis_reactions_all_count.keys(),
-                        loc='upper right',
-                        bbox_to_anchor=(1.15, 1.15))
-            else:
-                plt.bar(x, [self.top_reactions_emojis[emoji_key]['all'] for emoji_key in self.top_reactions_emojis], align='center')
-                
-
-            plt.xticks(x, self.top_reactions_emojis)
-            plt.title('Top {} reactions emojis'.format(self.nbr_top_emojis))
-            plt.ylabel('Number of times used')
-            ax = plt.gca()  # Get the current Axes instance
-            ax.yaxis.grid(linestyle='--')
-            ax.spines['top'].set_visible(False)
-            ax.spines['right'].set_visible(False)
-            ax.spines['bottom'].set_linewidth(0.5)
-            ax.spines['left'].set_linewidth(0.5)
-            plt.tight_layout()
-            pdf.savefig()
-            plt.close()
-            pb.printProgressBar()
-            
             # Plot top characters
-            plt.rcParams['figure.figsize'] = figsize['pie']
             create_pie_chart_with_rest('Top {} characters'.format(self.nbr_top_characters), list(self.top_chars.values()), list(self.top_chars.keys()), self.nbr_top_characters, pdf)
             pb.printProgressBar()
-            
 
-            plt.rcParams['figure.figsize'] = figsize['text']
             # Text statistics 1
-            plt.title('Text Statistics', fontsize=16, fontweight='bold')
-            plt.axis('off')
-
             text_stats = [
                 'Start: {}'.format(self.time_start_str),
                 'End: {}'.format(self.time_end_str),
@@ -607,25 +555,25 @@ class FacebookChatStatistics(FacebookMessengerConversation):
                 'Number of audio: {}'.format(self.nbr_audio),
                 'Number of shares: {}'.format(self.nbr_shares),
             ]
-
-            y = 1.0
-            for elem in text_stats:
-                plt.text(0.0, y, elem, fontsize=12, verticalalignment='center')
-                y -= 0.025
-
-            pdf.savefig()
-            plt.close()
+            fig, ax = templates.text_page('Text Statistics')
+            text_block(ax, 0.0, 1.0, text_stats)
+            pdf.savefig(fig)
             pb.printProgressBar()
 
             # Text statistics 2
-            plt.axis('off')
             text_stats = []
             # Participants averages
             text_stats.append('   {: <20} {: >12} {: >12} {: >15} {: >18} {: >18}'.format('Participant', 'Words/msg', 'Chars/msg', 'Chars/word', 'Avg reply time', 'Median reply time'))
-            for i, p in enumerate(list(self.nbr_msg_p.keys())[:self.max_participants_on_plots], 1):
+            for i, p in enumerate(top_p, 1):
                 text_stats.append('{}. {: <20}: {:>5.1f} w/msg{:>8.1f} ch/msg{:>7.1f} ch/w{:>11.0f} s{:>13.0f} s'.format(
                     i, p, self.avg_words_per_msg_p[p], self.avg_chars_per_msg_p[p], self.avg_chars_per_word_p[p], self.avg_reply_time_p[p], self.median_reply_time_p[p]))
             
+            # Reply pairs
+            text_stats.append('')
+            text_stats.append('   {: <20}    {: <20} {: >8} {: >10}'.format('Replier', 'Author', 'Replies', 'Median'))
+            for i, (p, q, count, median) in enumerate(self.top_reply_pairs(self.max_participants_on_plots), 1):
+                text_stats.append('{}. {: <20} -> {: <20} {:>8} {:>8.0f} s'.format(i, p, q, count, median))
+
             # Emojis
             text_stats.append('')
             text_stats.append(f'Top {self.nbr_top_emojis} emojis: {list(self.top_emojis.keys())}')
@@ -648,32 +596,19 @@ class FacebookChatStatistics(FacebookMessengerConversation):
                     continue
                 text_stats.append(f'{i}. {p}: {self.emojis_reactions_all_count[p]}')
 
-
-            y = 1.0
-            for elem in text_stats:
-                plt.text(0.0, y, elem, fontsize=12, verticalalignment='center')
-                y -= 0.025
-
-            pdf.savefig()
-            plt.close()
+            fig, ax = templates.text_page()
+            text_block(ax, 0.0, 1.0, text_stats)
+            pdf.savefig(fig)
             pb.printProgressBar()
 
-            # Top words
-            plt.title('Top words', fontsize=16, fontweight='bold')
-            plt.axis('off')
-
-            y = 0.95
-            x = 0.0
-            for j, word in enumerate(list(self.top_words.keys())[:self.nbr_top_words]):
-                    plt.text(x, y - 0.025*(j+1), '{}. {}: {}'.format(j+1, list(self.top_words.keys())[j], list(self.top_words.values())[j]), fontsize=12, verticalalignment='center')
-            for i, p in enumerate(list(self.nbr_msg_p.keys())[:4], 1):
-                y = 0.95
-                plt.text(x + 0.22*i, y, p.split()[0], fontsize=12, verticalalignment='center')
-                for j, word in enumerate(list(self.top_words_p[p].keys())[:self.nbr_top_words], 1):
-                    plt.text(x + 0.22*i, y - 0.025*j, '{}: {}'.format(word, self.top_words_p[p][word]), fontsize=12, verticalalignment='center')
-
-            pdf.savefig()
-            plt.close()
+            # Top words, one text block per column
+            fig, ax = templates.text_page('Top words')
+            words = list(self.top_words.items())[:self.nbr_top_words]
+            text_block(ax, 0.0, 0.95, [''] + ['{}. {}: {}'.format(j, word, count) for j, (word, count) in enumerate(words, 1)])
+            for i, p in enumerate(top_p[:4], 1):
+                words = list(self.top_words_p[p].items())[:self.nbr_top_words]
+                text_block(ax, 0.22*i, 0.95, [p.split()[0]] + ['{}: {}'.format(word, count) for word, count in words])
+            pdf.savefig(fig)
             pb.printProgressBar()
 
             # PDF info
@@ -687,10 +622,18 @@ class FacebookChatStatistics(FacebookMessengerConversation):
         pb.printProgressBar()
         if print_in_terminal: print('\nPDF \'{}\' generated successfully!'.format(filename))
     
-    def generate_txt(self, print_in_terminal=False):
-        # Create a text file for better readability of statistics especialy for large groups chats
-        txt_filename = self.title + '.txt'
-        txt_file_path = os.path.join('results', txt_filename)
+    def generate_html(self):
+        # HTML report with SVG charts, much faster than matplotlib
+        generate_html(self, os.path.join('results', self.output_name + '.html'), self.max_participants_on_plots)
+
+    def generate_txt(self, print_in_terminal=False, start=None, end=None, path=None):
+        if start is not None or end is not None:
+            self.generate_range_txt(start, end, print_in_terminal)
+            return
+        # Create a text file for better readability of statistics especialy for large groups chats,
+        # saved to `path` or results/<output_name>.txt
+        txt_filename = self.output_name + '.txt'
+        txt_file_path = os.path.join('results', txt_filename) if path is None else path
         with open(txt_file_path, 'w', encoding='utf8') as txt:
             txt.write(banner('Times') + '\n')
             txt.write('Start: {}\nEnd: {}\n'.format(self.time_start_str, self.time_end_str))
@@ -698,14 +641,25 @@ class FacebookChatStatistics(FacebookMessengerConversation):
             txt.write('Number of active days: {} ({:.3} %)\n'.format(self.nbr_days_active, 100*self.nbr_days_active/self.nbr_days))
             txt.write('Number of active days in row: {} ({} : {})\n'.format(self.nbr_days_active_in_row, self.time_start_days_active_in_row_str, self.time_end_days_active_in_row_str))
             txt.write('Number of inactive days in row: {} ({} : {})\n'.format(self.nbr_days_inactive_in_row, self.time_start_days_inactive_in_row_str, self.time_end_days_inactive_in_row_str))
+            txt.write('Longest active streaks: {}\n'.format(', '.join('{} ({} : {})'.format(*streak) for streak in self.top_active_streaks(5))))
+            txt.write('Longest inactive gaps: {}\n'.format(', '.join('{} ({} : {})'.format(*gap) for gap in self.top_inactive_gaps(5))))
             txt.write('Most messages in one day: {}\n'.format(max(self.nbr_times_day)))
+            for window in self.rolling_windows:
+                rolling = self.get_rolling_window(window)
+                busiest = int(np.argmax(rolling['nbr_msg']))
+                most_active = int(np.argmax(rolling['active_days_ratio'][window - 1:])) + window - 1 if self.nbr_days >= window else self.nbr_days - 1
+                txt.write('Most messages in {} days: {} ({} : {}), most active {} days: {:.1%} (until {})\n'.format(
+                    window, rolling['nbr_msg'][busiest], self.timeline[max(busiest - window + 1, 0)], self.timeline[busiest],
+                    window, rolling['active_days_ratio'][most_active], self.timeline[most_active]))
 
             txt.write(banner('Messages') + '\n')
             txt.write('Number of messages: {}\n'.format(self.nbr_msg))
             txt.write(get_stats(self.nbr_msg_p, self.nbr_msg) + '\n')
+            txt.write('Most messages in a row: {} by {} ({} : {})\n'.format(self.nbr_msg_in_row_max, self.nbr_msg_in_row_max_participant, self.time_start_msg_in_row_max_str, self.time_end_msg_in_row_max_str))
 
             txt.write(banner('Words') + '\n')
             txt.write('Number of words: {}\n'.format(self.nbr_words))
+            txt.write('Number of distinct words: {}{}\n'.format('~' if self.approximate else '', self.nbr_distinct_words))
             txt.write(get_stats(self.nbr_words_p, self.nbr_words) + '\n')
             
             txt.write(banner('Characters') + '\n')
@@ -724,7 +678,21 @@ class FacebookChatStatistics(FacebookMessengerConversation):
             for i, p in enumerate(self.nbr_words_p, 1):
                 txt.write('{}. {: <20}: {:>5.1f} w/msg{:>8.1f} ch/msg{:>7.1f} ch/w{:>11.0f} s{:>13.0f} s\n'.format(
                     i, p, self.avg_words_per_msg_p[p], self.avg_chars_per_msg_p[p], self.avg_chars_per_word_p[p], self.avg_reply_time_p[p], self.median_reply_time_p[p]))
+            txt.write('Who replies to whom:\n')
+            for i, (p, q, count, median) in enumerate(self.top_reply_pairs(10), 1):
+                txt.write('{}. {: <20} -> {: <20}: {:>7} replies, median {:.0f} s\n'.format(i, p, q, count, median))
             
+            txt.write(banner('Sessions') + '\n')
+            txt.write('Number of sessions: {} (split by {:.0f} min without messages)\n'.format(self.sessions['nbr_sessions'], self.sessions['gap'] / 60))
+            txt.write('Average session: {:.1f} messages, {:.0f}h {:.0f}min\n'.format(self.sessions['avg_length'], self.sessions['avg_duration'] // 3600, (self.sessions['avg_duration'] % 3600) // 60))
+            txt.write('Median session: {:.1f} messages, {:.0f}h {:.0f}min\n'.format(self.sessions['median_length'], self.sessions['median_duration'] // 3600, (self.sessions['median_duration'] % 3600) // 60))
+            txt.write('Longest session: {:.0f}h {:.0f}min ({})\n'.format(self.sessions['max_duration'] // 3600, (self.sessions['max_duration'] % 3600) // 60, self.sessions['time_start_max_duration_str']))
+            txt.write('Most messages in one session: {}\n'.format(self.sessions['max_length']))
+            txt.write('Sessions started by:\n')
+            txt.write(get_stats(self.sessions['starts_p'], self.sessions['nbr_sessions']) + '\n')
+            txt.write('Sessions ended by:\n')
+            txt.write(get_stats(self.sessions['ends_p'], self.sessions['nbr_sessions']) + '\n')
+
             txt.write(banner('Edits') + '\n')
             txt.write('Number of editions: {}\n'.format(self.nbr_editions))
             #txt.write(get_stats(self.nbr_editions_p, self.nbr_editions) + '\n')
@@ -758,6 +726,9 @@ class FacebookChatStatistics(FacebookMessengerConversation):
             txt.write(banner('Reactions emojis') + '\n')
             txt.write('Top {} reactions emojis: {}\n'.format(self.nbr_top_emojis, list(self.top_reactions_emojis.keys())))
             txt.write(get_stats(self.emojis_reactions_all_count, sum(self.emojis_reactions_all_count.values())) + '\n')
+            txt.write('Who reacts to whom:\n')
+            for i, (actor, author, count) in enumerate(self.top_reaction_pairs(10), 1):
+                txt.write('{}. {: <20} -> {: <20}: {}\n'.format(i, actor, author, count))
 
             txt.write(banner('Top words') + '\n')
             if len(self.p) <= 10:
@@ -795,9 +766,73 @@ class FacebookChatStatistics(FacebookMessengerConversation):
 
         if print_in_terminal: print('\ntxt \'{}\' generated successfully!'.format(txt_filename))
 
-    def update_user_statistics(self, user):
-        user_statistics_path = os.path.join('results', 'user_statistics.json')
+    def generate_range_txt(self, start=None, end=None, print_in_terminal=False):
+        # Statistics of a range of days, served from the day cube without touching messages
+        stats = self.range_statistics(start, end)
+        txt_filename = '{} {}_{}.txt'.format(self.output_name, stats['start'].strftime('%Y-%m-%d'), stats['end'].strftime('%Y-%m-%d'))
+        if not os.path.exists('results'):
+            os.makedirs('results')
+        txt_file_path = os.path.join('results', txt_filename)
+        with open(txt_file_path, 'w', encoding='utf8') as txt:
+            txt.write(banner('Times') + '\n')
+            txt.write('Start: {}\nEnd: {}\n'.format(stats['start'].strftime('%Y-%m-%d'), stats['end'].strftime('%Y-%m-%d')))
+            txt.write('Number of days: {}\n'.format(stats['nbr_days']))
+            if stats['nbr_days']:
+                txt.write('Number of active days: {} ({:.3} %)\n'.format(stats['nbr_days_active'], 100*stats['nbr_days_active']/stats['nbr_days']))
+            txt.write('Most messages in one day: {}\n'.format(stats['most_msg_in_one_day']))
 
+            txt.write(banner('Messages') + '\n')
+            txt.write('Number of messages: {}\n'.format(stats['nbr_msg']))
+            if stats['nbr_msg']: txt.write(get_stats(stats['nbr_msg_p'], stats['nbr_msg']) + '\n')
+
+            txt.write(banner('Words') + '\n')
+            txt.write('Number of words: {}\n'.format(stats['nbr_words']))
+            if stats['nbr_words']: txt.write(get_stats(stats['nbr_words_p'], stats['nbr_words']) + '\n')
+
+            txt.write(banner('Characters') + '\n')
+            txt.write('Number of characters: {}\n'.format(stats['nbr_chars']))
+            if stats['nbr_chars']: txt.write(get_stats(stats['nbr_chars_p'], stats['nbr_chars']) + '\n')
+
+            txt.write(banner('Averages') + '\n')
+            txt.write('Average messages per day: {:.1f}\n'.format(stats['avg_msg_per_day']))
+            txt.write('Average length of messages: {:.1f} words\n'.format(stats['avg_words_per_msg']))
+            txt.write('Average length of messages: {:.1f} characters\n'.format(stats['avg_chars_per_msg']))
+            txt.write('Average length of word: {:.1f} characters\n'.format(stats['avg_chars_per_word']))
+            txt.write('   {: <20} {: >12} {: >12} {: >15}\n'.format('Participant', 'Words/msg', 'Chars/msg', 'Chars/word'))
+            for i, p in enumerate(stats['nbr_words_p'], 1):
+                txt.write('{}. {: <20}: {:>5.1f} w/msg{:>8.1f} ch/msg{:>7.1f} ch/w\n'.format(
+                    i, p, stats['avg_words_per_msg_p'][p], stats['avg_chars_per_msg_p'][p], stats['avg_chars_per_word_p'][p]))
+
+            txt.write(banner('Edits') + '\n')
+            txt.write('Number of editions: {}\n'.format(stats['nbr_editions']))
+
+            txt.write(banner('Unsent messages') + '\n')
+            txt.write('Number of unsent messages: {}\n'.format(stats['nbr_unsent_msg']))
+            if stats['nbr_unsent_msg']: txt.write(get_stats(stats['nbr_unsent_msg_p'], stats['nbr_unsent_msg']) + '\n')
+
+            txt.write(banner('Others') + '\n')
+            for name, metric in [('photos', 'photos'), ('videos', 'videos'), ('gifs', 'gifs'), ('stickers', 'stickers'),
+                                 ('files', 'files'), ('audio', 'audio'), ('shares', 'shares')]:
+                txt.write('Number of {}: {}\n'.format(name, stats['nbr_' + metric]))
+                if stats['nbr_' + metric]: txt.write(get_stats(stats['nbr_' + metric + '_p'], stats['nbr_' + metric]) + '\n')
+
+            txt.write(banner('Emojis') + '\n')
+            txt.write('Number of emojis: {}\n'.format(stats['nbr_emojis']))
+            if stats['nbr_emojis']: txt.write(get_stats(stats['nbr_emojis_p'], stats['nbr_emojis']) + '\n')
+
+        if print_in_terminal: print('\ntxt \'{}\' generated successfully!'.format(txt_filename))
+
+    def update_user_statistics(self, user, store=None):
+        user_statistics = self.get_user_statistics(user)
+        if store is None:
+            # Single conversation, regenerate json file right away
+            with UserStatisticsStore() as store:
+                store.update(user, self.title, user_statistics)
+                store.export_json(user)
+        else:
+            store.update(user, self.title, user_statistics)
+
+    def get_user_statistics(self, user):
         top_emojis_with_count = {key : self.top_emojis[key]['all'] for key in self.top_emojis}
         top_emojis_reactions_with_count = {key : self.top_reactions_emojis[key]['all'] for key in self.top_reactions_emojis}
 
@@ -830,14 +865,7 @@ class FacebookChatStatistics(FacebookMessengerConversation):
                     'user': self.emojis_reactions_all_count[user],
                     'top': top_emojis_reactions_with_count},
         }
-        if not os.path.isfile(user_statistics_path):
-            with open(user_statistics_path, 'w') as json_file:
-                json.dump({'conversations': {}}, json_file, indent=2)
-        
-        data = json.load(open(user_statistics_path))
-        data['conversations'].update({self.title: user_statistics})
-        with open(user_statistics_path, 'w') as json_file:
-            json.dump(data, json_file, indent=2)
+        return user_statistics
 
 def main():
     """
@@ -870,17 +898,44 @@ def main():
         print(fb.title, ' Not enough messages to generate statistics.')
         sys.exit()
     
-    fb.generate_pdf(True)
-    fb.generate_txt(True)
-    if user != None:
-        fb.update_user_statistics(user)
-
-    fb.create_conversation_txt()
+    fb.run(pdf=True, txt=True, user=user, transcript=True)
     
     time_end = time.time()
     print('\nExecution time: {:.2f} seconds'.format(time_end - time_start))
 
     
+def page_templates():
+    """Returns figures reused by PDF pages, creating them on first use.
+    """
+    global _page_templates
+    if _page_templates is None:
+        _page_templates = PageTemplates()
+    return _page_templates
+
+def pdf_executor():
+    """Returns the process pool rendering PDFs, starting it on first use.
+    """
+    global _pdf_executor
+    if _pdf_executor is None:
+        _pdf_executor = ProcessPoolExecutor(max_workers=1)
+    return _pdf_executor
+
+def shutdown_pdf_executor():
+    """Stops the process rendering PDFs.
+
+    Worker processes of a process pool must call it before they finish,
+    they wait for their child processes when exiting.
+    """
+    global _pdf_executor
+    if _pdf_executor is not None:
+        _pdf_executor.shutdown()
+        _pdf_executor = None
+
+def render_pdf(cls, snapshot):
+    """Renders the PDF report of a conversation restored from `snapshot`.
+    """
+    cls.from_snapshot_state(snapshot).generate_pdf()
+
 def banner(msg, ch='=', length=80):
     """Creates a banner with the message `msg`.
 
@@ -916,36 +971,27 @@ def get_stats(nbr_p : dict, nbr_all : int, max_p : int = 10) -> str:
 
 
 def create_pie_chart(title : str, fracs : list, legend : list, pdf_file):
+    fig, ax = page_templates().page('pie')
     # Set a wider range of colors for the color cycle
     if len(fracs) > 10:
         colors = plt.cm.tab20(np.linspace(0, 1, 20))
     else:
         colors = plt.cm.tab10(np.linspace(0, 1, 10))
-    plt.gca().set_prop_cycle('color', colors)
-    plt.pie(fracs, startangle=90, autopct='%1.1f%%', pctdistance=0.75)
-    plt.legend(legend,
+    ax.set_prop_cycle('color', colors)
+    ax.pie(fracs, startangle=90, autopct='%1.1f%%', pctdistance=0.75)
+    ax.legend(legend,
             loc='upper left',
             bbox_to_anchor=(-0.15, 1.15))
-    plt.axis('equal')
-    plt.title(title)
-    pdf_file.savefig()
-    plt.close()
+    ax.axis('equal')
+    ax.set_title(title)
+    pdf_file.savefig(fig)
 
 def create_pie_chart_with_rest(title : str, fracs, legend, max_on_plot : int, pdf_file, min_percentage : float = 2.5):
     # Add rest
-    fracs = list(fracs)
-    legend = list(legend)
-    if len(fracs) > max_on_plot:
-        min_val = sum(fracs) * min_percentage / 100
-        for elem in fracs[:max_on_plot]:
-            if elem < min_val:
-                max_on_plot -= 1
-        rest_val = sum(fracs) - sum(fracs[:max_on_plot])
-        fracs = fracs[:max_on_plot]
-        legend = legend[:max_on_plot]
-        if rest_val != 0:
-            fracs.append(rest_val)
-            legend.append('Rest')
+    fracs, legend, rest = top_with_rest(fracs, legend, max_on_plot, min_percentage)
+    if rest:
+        fracs.append(rest)
+        legend.append('Rest')
     create_pie_chart(title, fracs, legend, pdf_file)
 
 if __name__ == '__main__':
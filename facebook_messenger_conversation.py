@@ -1,9 +1,34 @@
 import json
+import gzip
+import bz2
+import codecs
+import lzma
+import mmap
+import pickle
 from datetime import datetime, timedelta
 import emoji
 import os
 import statistics
 import math
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+import numpy as np
+from sketches import SpaceSaving, WordSketch
+from export_archive import open_part
+try:
+    import orjson # Optional, parses bytes without decoding the whole file to str first
+except ImportError:
+    orjson = None
+
+# Facebook writes every byte of UTF-8 encoded text as a separate \u00XX escape,
+# runs of them are replaced with the bytes. Escaped backslashes are matched as
+# pairs so an escaped backslash followed by 'u00XX' is kept. Both start with
+# a backslash, which makes scanning for the pattern fast.
+ESCAPED_BYTES = re.compile(rb'\\(?:\\|u00[89a-fA-F][0-9a-fA-F](?:\\u00[89a-fA-F][0-9a-fA-F])*)')
+# The same bytes in strings parsed without repairing them
+MOJIBAKE_RUN = re.compile('[\x80-\xff]+')
 
 class FacebookMessengerConversation():
     """Module for getting stats of a Facebook Messenger conversation.
@@ -11,53 +36,75 @@ class FacebookMessengerConversation():
     Attributes:
         data (dict): The conversation of interest.
         title (str) : Title of the conversation.
+        folder (str): Name of the folder of the conversation, unlike the
+            title it is unique in the export.
+        output_name (str): Name of generated files, the title by default.
         p (list): List of conversation participants.
 
     """
 
-    def __init__(self, conversation, nbr_top_emojis=10, nbr_top_words=10, nbr_top_characters=10, max_reply_time_for_avg = 3600*24):
+    # Metrics counted per participant and day in `day_cube`, statistic names are 'nbr_' + metric
+    day_cube_metrics = ['msg', 'words', 'chars', 'emojis', 'photos', 'videos', 'gifs',
+                        'stickers', 'files', 'audio', 'shares', 'unsent_msg', 'editions']
+    # Lengths of rolling windows in days used in reports
+    rolling_windows = [7, 30, 365]
+    # Format of snapshots, increase when computed attributes change
+    snapshot_version = 3
+
+    def __init__(self, conversation, nbr_top_emojis=10, nbr_top_words=10, nbr_top_characters=10, max_reply_time_for_avg = 3600*24, session_gap = 3600,
+                 approximate=False, sketch_epsilon=0.0001, sketch_delta=0.01):
         """Prepares `conversation` and fetches its participants.
 
         Args:
             conversation (json): Conversation downloaded from
                 Facebook (see https://www.facebook.com/help/
-                212802592074644?helpref=uf_permalink)
+                212802592074644?helpref=uf_permalink), path to
+                message_1.json or list of its parts
+            approximate (bool): Use bounded memory sketches for word and
+                character statistics instead of exact counts. Emojis are
+                always counted exactly, there is a fixed set of them.
+            sketch_epsilon (float): Count-Min Sketch error relative to
+                number of words in approximate mode.
+            sketch_delta (float): Probability of exceeding `sketch_epsilon`.
 
         """
         self.nbr_top_emojis = nbr_top_emojis
         self.nbr_top_words = nbr_top_words
         self.nbr_top_characters = nbr_top_characters
         self.max_reply_time_for_avg = max_reply_time_for_avg
+        self.session_gap = session_gap # Seconds without messages that split conversation into sessions
+        self.approximate = approximate
+        self.sketch_epsilon = sketch_epsilon
+        self.sketch_delta = sketch_delta
+        self.sketch_capacity = max(20 * nbr_top_words, 100) # Number of heavy hitters kept by sketches
+        self.__sessions_cache = {}
+        self.__rolling_cache = {}
 
-        max_files_number = 10
         self.words_strip = ',.()?!@#$%^&*/_:;/\\"' # Characters to strip from words
         self.words_not_lower = ['xD', 'XD'] # Words that should not be lowercased
 
-        self.data, self.p = self.read_conversation(conversation)
-
-        if "_1.json" in conversation:
-            #print("Detected potential multiple files")
-            file_number = 1
-            for i in range(2, max_files_number + 1):
-                next_file_path = conversation.replace("_1.json", f"_{file_number + 1}.json")
-                if os.path.isfile(next_file_path):
-                    file_number += 1
-                    #print("File {} exists".format(next_file_path.split('\\')[-1]))
-                    data, p = self.read_conversation(next_file_path)
-                    self.data = self.join_data(self.data, data)
-                    self.p = list(set(self.p + p))
-                else:
-                    break
-            #print("Readed {} files".format(file_number))
-
-        self.title = str(self.data['title']).encode('raw_unicode_escape').decode('utf-8')
-
-        all_messages_str = ''.join([msg['content'] for msg in self.data['messages'] if 'content' in msg])
-        self.__emojis_str = ''.join([emoji.emojize(c) for c in emoji.EMOJI_UNICODE.values() if c in all_messages_str]) # All used emojis in string
-        self.__used_emojis_list = [emoji.UNICODE_EMOJI[c] for c in emoji.EMOJI_UNICODE.values() if c in all_messages_str] # All used emojis in list
-        all_reactions_emojis_str = ''.join([r['reaction'] for msg in self.data['messages'] if 'reactions' in msg for r in msg['reactions']])
-        self.__used_reaction_emojis_list = [emoji.UNICODE_EMOJI[c] for c in emoji.EMOJI_UNICODE.values() if c in all_reactions_emojis_str] # All used reaction emojis in list
+        parts = self.find_conversation_parts(conversation)
+        self.data, self.p = self.read_conversation_parts(parts)
+
+        self.title = str(self.data['title'])
+        self.folder = part_folder(parts[0]) # Titles are not unique, folders identify conversations
+        self.output_name = self.title
+
+        if self.approximate:
+            # Only distinct characters are kept, emojis made of multiple characters are not counted anyway
+            used_chars = set()
+            for msg in self.data['messages']:
+                if 'content' in msg:
+                    used_chars.update(msg['content'])
+            self.__emojis_str = ''.join([c for c in emoji.EMOJI_UNICODE.values() if c in used_chars]) # All used emojis in string
+            self.__used_emojis_list = [emoji.UNICODE_EMOJI[c] for c in emoji.EMOJI_UNICODE.values() if c in used_chars] # All used emojis in list
+        else:
+            all_messages_str = ''.join([msg['content'] for msg in self.data['messages'] if 'content' in msg])
+            self.__emojis_str = ''.join([emoji.emojize(c) for c in emoji.EMOJI_UNICODE.values() if c in all_messages_str]) # All used emojis in string
+            self.__used_emojis_list = [emoji.UNICODE_EMOJI[c] for c in emoji.EMOJI_UNICODE.values() if c in all_messages_str] # All used emojis in list
         self.__time_interval()
+        self.__message_columns()
+        self.__reaction_columns()
         self.__days()
         self.__messages()
         self.__words()
@@ -69,39 +116,92 @@ class FacebookMessengerConversation():
         self.__non_content_messages()
         self.__reply_times()
 
+        self.activity_tensor = self.get_activity_tensor()
         self.timeline, self.nbr_times_day, self.nbr_times_weekday, self.nbr_times_hour = self.get_timeline()
 
         self.top_emojis, self.emojis_all_count = self.get_top_emojis(self.nbr_top_emojis)
         self.top_reactions_emojis, self.emojis_reactions_all_count = self.get_top_reactions_emojis(self.nbr_top_emojis)
+        self.__day_cube()
+        self.sessions = self.get_sessions()
 
     
+    def find_conversation_parts(self, conversation):
+        """ Finds all files of a conversation split into multiple parts
+
+            Args:
+                conversation (str): Path to json file, e.g. message_1.json,
+                    or list of parts already found, e.g. members of an
+                    export archive (see `export_archive.py`)
+
+            Returns:
+                list: Paths to all parts sorted by their number
+        """
+        if isinstance(conversation, (list, tuple)):
+            return list(conversation)
+        directory, filename = os.path.split(conversation)
+        match = re.fullmatch(r'(.*)_1\.json', filename)
+        if match is None:
+            return [conversation]
+
+        pattern = re.compile(re.escape(match.group(1)) + r'_(\d+)\.json')
+        parts = {}
+        for f in os.listdir(directory or '.'):
+            part = pattern.fullmatch(f)
+            if part is not None:
+                parts[int(part.group(1))] = os.path.join(directory, f)
+        return [parts[n] for n in sorted(parts)]
+
+    def read_conversation_parts(self, conversations, max_workers=None):
+        """ Reads all parts of a conversation concurrently and merges them
+
+            Messages repeated in more parts are kept only in the first
+            one (see `drop_repeated_messages`).
+
+            Args:
+                conversations (list): Paths to json files, newest part first
+                max_workers (int): Number of threads used for reading
+
+            Returns:
+                tuple: data (dict), participants (list)
+        """
+        if len(conversations) == 1:
+            return self.read_conversation(conversations[0])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parts = list(executor.map(self.read_conversation, conversations))
+
+        drop_repeated_messages([part_data for part_data, _ in parts])
+        data = parts[0][0]
+        for part_data, _ in parts[1:]:
+            data = self.join_data(data, part_data)
+        p = list(dict.fromkeys(name for _, part_p in parts for name in part_p))
+
+        # Parts should not overlap, but keep messages newest first if they do
+        timestamps = [message['timestamp_ms'] for message in data['messages']]
+        if any(t1 < t2 for t1, t2 in zip(timestamps, timestamps[1:])):
+            data['messages'].sort(key=lambda message: message['timestamp_ms'], reverse=True)
+
+        return data, p
+
     def read_conversation(self, conversation):
         """ Reads a conversation from a JSON file and returns the data and participants.
 
+            Text is decoded while the file is read (see `read_json_part`),
+            so all strings of the data are already proper unicode.
+
             Args:
-                conversation (json): Path to json file
+                conversation (json): Path to json file or ArchiveMember
 
             Returns:
                 tuple: data (dict), participants (list)
         """
-        data = json.load(open(conversation))
+        data = read_json_part(conversation)
 
-        # Convert unicode characters
-        for p in data['participants']:
-            p['name'] = p['name'].encode('raw_unicode_escape').decode('utf-8')
         for message in data['messages']:
-            message['sender_name'] = message['sender_name'].encode(
-                'raw_unicode_escape').decode('utf-8')
             if 'content' in message:
-                message['content'] = message['content'].encode(
-                    'raw_unicode_escape').decode('utf-8')
                 message['content'] = self.interpret_emojis(message['content'])
             if 'reactions' in message:
                 for reaction in message['reactions']:
-                    reaction['actor'] = reaction['actor'].encode(
-                        'raw_unicode_escape').decode('utf-8')
-                    reaction['reaction'] = reaction['reaction'].encode(
-                        'raw_unicode_escape').decode('utf-8')
                     reaction['reaction'] = self.interpret_emojis(reaction['reaction'])
 
         for p in data['participants']:
@@ -161,7 +261,7 @@ class FacebookMessengerConversation():
         new_data['magic_words'].extend(data_2['magic_words'])
         if new_data['title'] != data_2['title']:
             new_data['title'] = "multiple conversations"
-            new_data.pop('thread_path')
+            new_data.pop('thread_path', None)
         return new_data
 
     def __time_interval(self):
@@ -172,6 +272,61 @@ class FacebookMessengerConversation():
         self.time_start_str = self.time_start.strftime('%Y-%m-%d %H:%M:%S')
         self.time_end_str = self.time_end.strftime('%Y-%m-%d %H:%M:%S')
 
+    def __message_columns(self):
+        """Creates arrays with timestamp, local time, day index and sender of every message
+        """
+        p_codes = {p: i for i, p in enumerate(self.p)}
+        self.timestamps_ms = np.array([message['timestamp_ms'] for message in self.data['messages']], dtype=np.int64)
+        self.sender_codes = np.array([p_codes[message['sender_name']] for message in self.data['messages']], dtype=np.int64)
+        self.local_seconds = local_seconds(self.timestamps_ms)
+        # Number of days since the first day of the conversation, index of `timeline`
+        self.day_index = self.local_seconds // 86400 - self.local_seconds[-1] // 86400
+
+    def __reaction_columns(self):
+        """Flattens reactions into arrays of message index, actor, message sender and emoji id
+
+        Actors who are not participants have code -1, emoji id indexes `reaction_emojis`.
+        """
+        p_codes = {p: i for i, p in enumerate(self.p)}
+        emoji_ids = {}
+        msg_index, actor_codes, emojis = [], [], []
+        for i, message in enumerate(self.data['messages']):
+            if 'reactions' in message:
+                for reaction in message['reactions']:
+                    msg_index.append(i)
+                    actor_codes.append(p_codes.get(reaction['actor'], -1))
+                    emojis.append(emoji_ids.setdefault(reaction['reaction'], len(emoji_ids)))
+
+        self.reaction_emojis = list(emoji_ids)
+        self.reaction_msg_index = np.array(msg_index, dtype=np.int64)
+        self.reaction_actor_codes = np.array(actor_codes, dtype=np.int64)
+        self.reaction_target_codes = self.sender_codes[self.reaction_msg_index]
+        self.reaction_emoji_ids = np.array(emojis, dtype=np.int64)
+
+        all_reactions_emojis_str = ''.join(self.reaction_emojis)
+        self.__used_reaction_emojis_list = [emoji.UNICODE_EMOJI[c] for c in emoji.EMOJI_UNICODE.values() if c in all_reactions_emojis_str] # All used reaction emojis in list
+
+        # Sparse reactor -> author matrix, only pairs that reacted at least once
+        nbr_p = len(self.p)
+        known = self.reaction_actor_codes >= 0
+        pairs, counts = np.unique(self.reaction_actor_codes[known] * nbr_p + self.reaction_target_codes[known], return_counts=True)
+        self.reactions_graph = {p: {} for p in self.p}
+        for pair, count in zip(pairs.tolist(), counts.tolist()):
+            self.reactions_graph[self.p[pair // nbr_p]][self.p[pair % nbr_p]] = count
+
+    def top_reaction_pairs(self, nbr):
+        """Returns the top `nbr` pairs of participants reacting to messages of each other.
+
+        Args:
+            nbr (int): The number of pairs to include in top list.
+
+        Returns:
+            list: Tuples (actor, author of the message, number of reactions), most first
+
+        """
+        pairs = [(actor, author, count) for actor in self.reactions_graph for author, count in self.reactions_graph[actor].items()]
+        return sorted(pairs, key=lambda pair: pair[2], reverse=True)[:nbr]
+
     def __reply_times(self):
         self.reply_times = []
         self.reply_times_p = {p: [] for p in self.p}
@@ -215,89 +370,139 @@ class FacebookMessengerConversation():
         self.mode_self_reply_time_p = {p: statistics.mode(temp_self_reply_times_p[p]) if len(temp_self_reply_times_p[p]) != 0 else 0.0 for p in self.p}
         self.mode_reply_time = statistics.mode(temp_reply_times) if len(temp_reply_times) != 0 else 0.0
 
+        self.__reply_graph()
+
+    def __reply_graph(self):
+        """Creates sparse replier -> author graph with number of replies and median reply time of every pair
+        """
+        # Messages are newest first, so sender of message i replies to sender of message i + 1
+        replier, author = self.sender_codes[:-1], self.sender_codes[1:]
+        reply_times = (self.timestamps_ms[:-1] - self.timestamps_ms[1:]) / 1000
+        mask = (replier != author) & (reply_times >= 0)
+        pairs = replier[mask] * len(self.p) + author[mask]
+        reply_times = reply_times[mask]
+
+        self.replies_graph = {p: {} for p in self.p}
+        self.median_reply_time_graph = {p: {} for p in self.p}
+        order = np.lexsort((reply_times, pairs))
+        pairs, reply_times = pairs[order], reply_times[order]
+        unique_pairs, starts, counts = np.unique(pairs, return_index=True, return_counts=True)
+        for pair, start, count in zip(unique_pairs.tolist(), starts.tolist(), counts.tolist()):
+            p, q = self.p[pair // len(self.p)], self.p[pair % len(self.p)]
+            times = reply_times[start:start + count]
+            times = times[times <= self.max_reply_time_for_avg]
+            self.replies_graph[p][q] = count
+            self.median_reply_time_graph[p][q] = float(np.median(times)) if len(times) != 0 else 0.0
+
+    def top_reply_pairs(self, nbr):
+        """Returns the top `nbr` pairs of participants replying to each other.
+
+        Args:
+            nbr (int): The number of pairs to include in top list.
+
+        Returns:
+            list: Tuples (replier, author of the previous message, number of replies,
+                median reply time in seconds), most replies first
+
+        """
+        pairs = [(p, q, count, self.median_reply_time_graph[p][q]) for p in self.replies_graph for q, count in self.replies_graph[p].items()]
+        return [pairs[i] for i in top_n([pair[2] for pair in pairs], nbr)]
+
+    def top_participants(self, nbr):
+        """Returns the `nbr` participants who sent the most messages, most messages first.
+
+        Plots and tables of groups show only these participants, the others
+        are grouped as Rest.
+        """
+        return [self.p[i] for i in top_n(self.day_cube[self.day_cube_metrics.index('msg'), :, -1], nbr)]
+
 
     def __days(self):
+        """Computes active days, activity timeline, active streaks and inactive gaps from sorted unique days
+        """
         self.nbr_days = (self.time_end.date() - self.time_start.date()).days + 1
 
-        days = set()
-        activity_timeline = [0] * self.nbr_days
-        nbr_active_days = 0
-        for message in reversed(self.data['messages']):
-            current = datetime.fromtimestamp(message['timestamp_ms']/1000).date()
-            current_day_nbr = (current - self.time_start.date()).days
-            if current not in days:
-                days.add(current)
-                nbr_active_days += 1
-                activity_timeline[current_day_nbr] = nbr_active_days
-        
-        for i in range(self.nbr_days):
-            if activity_timeline[i] == 0:
-                activity_timeline[i] = activity_timeline[i-1]
-
-        self.activity_timeline = [x / (i + 1) for i, x in enumerate(activity_timeline)]
+        days = np.unique(self.day_index)
+        active = np.zeros(self.nbr_days, dtype=bool)
+        active[days] = True
+        self.__nbr_days_active_cumsum = np.cumsum(active)
+        self.activity_timeline = (self.__nbr_days_active_cumsum / np.arange(1, self.nbr_days + 1)).tolist()
         self.nbr_days_active = len(days)
 
-        self.nbr_days_active_in_row = 1
-        self.nbr_days_inactive_in_row = 1
-        prev_date = datetime.fromtimestamp(self.data['messages'][-1]['timestamp_ms']/1000).date()
-        self.time_start_days_active_in_row_str = prev_date.strftime('%Y-%m-%d')
-        self.time_end_days_active_in_row_str = prev_date.strftime('%Y-%m-%d')
-        self.time_start_days_inactive_in_row_str = prev_date.strftime('%Y-%m-%d')
-        self.time_end_days_inactive_in_row_str = prev_date.strftime('%Y-%m-%d')
-        temp_days = 1
-        for message in reversed(self.data['messages']):
-            current = datetime.fromtimestamp(message['timestamp_ms']/1000).date()
-            if prev_date == current - timedelta(days=1):
-                temp_days += 1
-            elif prev_date < current - timedelta(days=1):
-                if temp_days > self.nbr_days_active_in_row:
-                    self.nbr_days_active_in_row = temp_days
-                    self.time_start_days_active_in_row_str = (prev_date - timedelta(days=temp_days-1)).strftime('%Y-%m-%d')
-                    self.time_end_days_active_in_row_str = prev_date.strftime('%Y-%m-%d')
-                temp_days = 1
-                inactive_days = (current - prev_date).days - 1
-                if inactive_days > self.nbr_days_inactive_in_row:
-                    self.nbr_days_inactive_in_row = inactive_days
-                    self.time_start_days_inactive_in_row_str = (prev_date + timedelta(days=1)).strftime('%Y-%m-%d')
-                    self.time_end_days_inactive_in_row_str = (current - timedelta(days=1)).strftime('%Y-%m-%d')
-            prev_date = current
-        
-            
+        # Run-length encoding of active days, a new streak starts after every gap
+        breaks = np.flatnonzero(np.diff(days) > 1)
+        self.__streak_starts = days[np.concatenate(([0], breaks + 1))]
+        self.__streak_ends = days[np.concatenate((breaks, [len(days) - 1]))]
+        self.__gap_starts = self.__streak_ends[:-1] + 1
+        self.__gap_ends = self.__streak_starts[1:] - 1
+
+        streaks = self.top_active_streaks(1)
+        self.nbr_days_active_in_row, self.time_start_days_active_in_row_str, self.time_end_days_active_in_row_str = streaks[0]
+        gaps = self.top_inactive_gaps(1)
+        if gaps:
+            self.nbr_days_inactive_in_row, self.time_start_days_inactive_in_row_str, self.time_end_days_inactive_in_row_str = gaps[0]
+        else:
+            self.nbr_days_inactive_in_row = 0
+            self.time_start_days_inactive_in_row_str = self.time_end_days_inactive_in_row_str = self.time_start.strftime('%Y-%m-%d')
+
+    def __top_runs(self, starts, ends, nbr):
+        lengths = ends - starts + 1
+        order = np.argsort(-lengths, kind='stable')[:nbr]
+        first_day = self.time_start.date()
+        return [(int(lengths[i]), (first_day + timedelta(days=int(starts[i]))).strftime('%Y-%m-%d'),
+                 (first_day + timedelta(days=int(ends[i]))).strftime('%Y-%m-%d')) for i in order]
+
+    def top_active_streaks(self, nbr):
+        """Returns the `nbr` longest runs of consecutive active days.
+
+        Args:
+            nbr (int): The number of streaks to return.
+
+        Returns:
+            list: Tuples (number of days, first day, last day), longest first
+
+        """
+        return self.__top_runs(self.__streak_starts, self.__streak_ends, nbr)
+
+    def top_inactive_gaps(self, nbr):
+        """Returns the `nbr` longest runs of consecutive days without messages.
+
+        Args:
+            nbr (int): The number of gaps to return.
+
+        Returns:
+            list: Tuples (number of days, first day, last day), longest first
+
+        """
+        return self.__top_runs(self.__gap_starts, self.__gap_ends, nbr)
 
     def __messages(self):
         self.nbr_msg = len(self.data['messages'])
-        self.nbr_unsent_msg_p = {p: 0 for p in self.p}
-        self.nbr_msg_in_row_p = {p: {n: 0 for n in range(1, 10)} for p in self.p}
+        nbr_p = len(self.p)
+        act = dict(zip(self.p, np.bincount(self.sender_codes, minlength=nbr_p).tolist()))
+        unsent_codes = [self.sender_codes[i] for i, message in enumerate(self.data['messages']) if 'is_unsent' in message]
+        self.nbr_unsent_msg_p = dict(zip(self.p, np.bincount(np.array(unsent_codes, dtype=np.int64), minlength=nbr_p).tolist()))
+
+        # Run-length encoding of senders, every run is one burst of messages in a row
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(self.sender_codes)) + 1))
+        lengths = np.diff(np.concatenate((starts, [self.nbr_msg])))
+        senders = self.sender_codes[starts]
+
+        pairs, counts = np.unique(np.stack((senders, lengths)), axis=1, return_counts=True)
+        self.burst_lengths_p = {p: {} for p in self.p}
+        for sender, length, count in zip(pairs[0].tolist(), pairs[1].tolist(), counts.tolist()):
+            self.burst_lengths_p[self.p[sender]][length] = count
+
+        self.nbr_msg_in_row_p = {p: {n: self.burst_lengths_p[p].get(n, 0) for n in range(1, 10)} for p in self.p}
         for p in self.p:
-            self.nbr_msg_in_row_p[p]['more'] = 0
+            self.nbr_msg_in_row_p[p]['more'] = sum(count for n, count in self.burst_lengths_p[p].items() if n >= 10)
 
-        act = {p: 0 for p in self.p}
-        last_participant = None
-        nbr_msg_in_row = 0
-        for message in self.data['messages']:
-            try:
-                act[message['sender_name']] += 1
-                if 'is_unsent' in message:
-                    self.nbr_unsent_msg_p[message['sender_name']] += 1
-                if last_participant == None:
-                    last_participant = message['sender_name']
-                    nbr_msg_in_row = 1
-                elif message['sender_name'] == last_participant:
-                    nbr_msg_in_row += 1
-                else:
-                    if self.nbr_msg_in_row_p[last_participant].get(nbr_msg_in_row) == None:
-                        self.nbr_msg_in_row_p[last_participant]['more'] += 1
-                    else:
-                        self.nbr_msg_in_row_p[last_participant][nbr_msg_in_row] += 1
-                    nbr_msg_in_row = 1
-                    last_participant = message['sender_name']
-            except KeyError:
-                pass
-        
-        if self.nbr_msg_in_row_p[last_participant].get(nbr_msg_in_row) == None:
-            self.nbr_msg_in_row_p[last_participant]['more'] += 1
-        else:
-            self.nbr_msg_in_row_p[last_participant][nbr_msg_in_row] += 1
+        # Messages are newest first, so the burst starts at its last message
+        longest = int(np.argmax(lengths))
+        self.nbr_msg_in_row_max = int(lengths[longest])
+        self.nbr_msg_in_row_max_participant = self.p[senders[longest]]
+        self.time_start_msg_in_row_max_str = datetime.fromtimestamp(self.timestamps_ms[starts[longest] + lengths[longest] - 1]/1000).strftime('%Y-%m-%d %H:%M:%S')
+        self.time_end_msg_in_row_max_str = datetime.fromtimestamp(self.timestamps_ms[starts[longest]]/1000).strftime('%Y-%m-%d %H:%M:%S')
 
         self.nbr_msg_p = dict(sorted(act.items(), key=lambda item: item[1], reverse=True))
         self.nbr_unsent_msg_p = dict(sorted(self.nbr_unsent_msg_p.items(), key=lambda item: item[1], reverse=True))
@@ -355,6 +560,207 @@ class FacebookMessengerConversation():
         self.nbr_editions = sum(self.nbr_editions_p.values())
 
 
+    def __day_cube(self):
+        """Creates cumulative counts of `day_cube_metrics` per participant and day.
+
+        `day_cube[m, p, d]` is the number of metric `m` of participant `p`
+        before day `d`, so any range of days is a difference of two columns.
+        """
+        metric = {m: i for i, m in enumerate(self.day_cube_metrics)}
+        media = {'photos': 'photos', 'videos': 'videos', 'gifs': 'gifs', 'sticker': 'stickers',
+                 'files': 'files', 'audio_files': 'audio', 'share': 'shares', 'is_unsent': 'unsent_msg'}
+        used_emojis = set(self.__used_emojis_list)
+        emojis_table = {ord(c): None for c in self.__emojis_str if emoji.demojize(c) in used_emojis}
+
+        values = np.zeros((len(self.day_cube_metrics), len(self.data['messages'])), dtype=np.int64)
+        values[metric['msg']] = 1
+        for i, message in enumerate(self.data['messages']):
+            if 'content' in message:
+                content = message['content']
+                words = content.split()
+                values[metric['words'], i] = len(words) - (1 if words and words[-1] == '(edited)' else 0)
+                values[metric['chars'], i] = len(content.replace(' ', '')) - (9 if content.endswith('(edited)') else 0)
+                values[metric['emojis'], i] = len(content) - len(content.translate(emojis_table))
+                values[metric['editions'], i] = content.endswith(' (edited)')
+            for key in media:
+                if key in message:
+                    values[metric[media[key]], i] = 1
+
+        nbr_p = len(self.p)
+        index = self.sender_codes * self.nbr_days + self.day_index
+        cube = np.zeros((len(self.day_cube_metrics), nbr_p, self.nbr_days + 1), dtype=np.int64)
+        for m in range(len(self.day_cube_metrics)):
+            counts = np.bincount(index, weights=values[m], minlength=nbr_p * self.nbr_days)
+            cube[m, :, 1:] = np.cumsum(counts.reshape(nbr_p, self.nbr_days), axis=1)
+        self.day_cube = cube
+
+        self.__day_cube_active = np.concatenate(([0], self.__nbr_days_active_cumsum))
+
+    def range_statistics(self, start=None, end=None):
+        """Returns statistics of messages sent between `start` and `end`.
+
+        Counts are differences of two `day_cube` columns, so every query
+        costs O(participants) regardless of the number of messages.
+
+        Args:
+            start (date or str): First day of the range ('YYYY-MM-DD'),
+                defaults to the first day of the conversation.
+            end (date or str): Last day of the range ('YYYY-MM-DD'),
+                defaults to the last day of the conversation.
+
+        Returns:
+            dict: Statistics named as attributes of the conversation, e.g.
+                'nbr_msg', 'nbr_msg_p', 'avg_words_per_msg'.
+
+        """
+        start = to_date(start) if start is not None else self.time_start.date()
+        end = to_date(end) if end is not None else self.time_end.date()
+        first = min(max((start - self.time_start.date()).days, 0), self.nbr_days)
+        last = min((end - self.time_start.date()).days, self.nbr_days - 1)
+        last = max(last, first - 1)
+
+        counts = self.day_cube[:, :, last + 1] - self.day_cube[:, :, first]
+        nbr_days = last - first + 1
+        stats = {'start': start, 'end': end, 'nbr_days': nbr_days,
+                 'nbr_days_active': int(self.__day_cube_active[last + 1] - self.__day_cube_active[first]),
+                 'most_msg_in_one_day': max(self.nbr_times_day[first:last + 1], default=0)}
+        for m, metric in enumerate(self.day_cube_metrics):
+            nbr_p = {p: int(counts[m, i]) for i, p in enumerate(self.p)}
+            stats['nbr_' + metric + '_p'] = dict(sorted(nbr_p.items(), key=lambda item: item[1], reverse=True))
+            stats['nbr_' + metric] = int(counts[m].sum())
+
+        nbr_msg, nbr_words, nbr_chars = stats['nbr_msg'], stats['nbr_words'], stats['nbr_chars']
+        stats['avg_msg_per_day'] = nbr_msg/nbr_days if nbr_days > 0 else 0.0
+        stats['avg_words_per_msg'] = nbr_words/nbr_msg if nbr_msg > 0 else 0.0
+        stats['avg_chars_per_msg'] = nbr_chars/nbr_msg if nbr_msg > 0 else 0.0
+        stats['avg_chars_per_word'] = nbr_chars/nbr_words if nbr_words > 0 else 0.0
+        nbr_msg_p, nbr_words_p, nbr_chars_p = stats['nbr_msg_p'], stats['nbr_words_p'], stats['nbr_chars_p']
+        stats['avg_words_per_msg_p'] = {p: nbr_words_p[p]/nbr_msg_p[p] if nbr_msg_p[p] > 0 else 0.0 for p in self.p}
+        stats['avg_chars_per_msg_p'] = {p: nbr_chars_p[p]/nbr_msg_p[p] if nbr_msg_p[p] > 0 else 0.0 for p in self.p}
+        stats['avg_chars_per_word_p'] = {p: nbr_chars_p[p]/nbr_words_p[p] if nbr_words_p[p] > 0 else 0.0 for p in self.p}
+        return stats
+
+    def get_sessions(self, gap=None):
+        """Splits the conversation into sessions separated by more than `gap` seconds without messages.
+
+        Results are cached for every `gap`.
+
+        Args:
+            gap (int): Minimal gap between sessions in seconds, defaults to `session_gap`.
+
+        Returns:
+            dict: Number of sessions, arrays of their lengths (messages) and
+                durations (seconds) in chronological order, who starts and who
+                ends sessions and number of sessions started every day of `timeline`.
+
+        """
+        gap = self.session_gap if gap is None else gap
+        if gap in self.__sessions_cache:
+            return self.__sessions_cache[gap]
+
+        # Chronological order, oldest message first
+        timestamps = self.timestamps_ms[::-1]
+        senders = self.sender_codes[::-1]
+        days = self.day_index[::-1]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(timestamps) > gap * 1000) + 1))
+        ends = np.concatenate((starts[1:], [len(timestamps)])) - 1
+        lengths = ends - starts + 1
+        durations = (timestamps[ends] - timestamps[starts]) / 1000
+
+        nbr_p = len(self.p)
+        starts_p = dict(zip(self.p, np.bincount(senders[starts], minlength=nbr_p).tolist()))
+        ends_p = dict(zip(self.p, np.bincount(senders[ends], minlength=nbr_p).tolist()))
+        longest = int(np.argmax(durations))
+        sessions = {
+            'gap': gap,
+            'nbr_sessions': len(starts),
+            'lengths': lengths,
+            'durations': durations,
+            'avg_length': float(lengths.mean()),
+            'median_length': float(np.median(lengths)),
+            'avg_duration': float(durations.mean()),
+            'median_duration': float(np.median(durations)),
+            'max_length': int(lengths.max()),
+            'max_duration': float(durations[longest]),
+            'time_start_max_duration_str': datetime.fromtimestamp(timestamps[starts[longest]]/1000).strftime('%Y-%m-%d %H:%M:%S'),
+            'starts_p': dict(sorted(starts_p.items(), key=lambda item: item[1], reverse=True)),
+            'ends_p': dict(sorted(ends_p.items(), key=lambda item: item[1], reverse=True)),
+            'nbr_sessions_day': np.bincount(days[starts], minlength=self.nbr_days).tolist(),
+        }
+        self.__sessions_cache[gap] = sessions
+        return sessions
+
+    def get_rolling_window(self, window):
+        """Returns statistics of trailing `window` days ending at every day of `timeline`.
+
+        Every value is a difference of two cumulative sums, so the cost is
+        O(days) regardless of `window`. Results are cached for every `window`.
+
+        Args:
+            window (int): Length of the window in days.
+
+        Returns:
+            dict: Arrays aligned with `timeline`: 'nbr_msg' messages in the window,
+                'avg_msg_per_day' its average and 'active_days_ratio' share of active days.
+
+        """
+        if window in self.__rolling_cache:
+            return self.__rolling_cache[window]
+
+        nbr_msg = rolling_sum(np.concatenate(([0], np.cumsum(self.nbr_times_day))), window)
+        days_in_window = np.minimum(np.arange(1, self.nbr_days + 1), window)
+        active_days = rolling_sum(self.__day_cube_active, window)
+
+        rolling = {
+            'window': window,
+            'nbr_msg': nbr_msg,
+            'avg_msg_per_day': nbr_msg / days_in_window,
+            'active_days_ratio': active_days / days_in_window,
+        }
+        self.__rolling_cache[window] = rolling
+        return rolling
+
+    def get_rolling_share(self, window, participants):
+        """Returns share of messages of `participants` in trailing `window` days ending at every day of `timeline`.
+
+        Only rows of `participants` are summed, so the cost does not depend
+        on the number of participants of the group.
+
+        Args:
+            window (int): Length of the window in days.
+            participants (list): Participants, e.g. from `top_participants`.
+
+        Returns:
+            tuple: Array with a row of shares for every participant of `participants`
+                and array of share of all the other participants (Rest).
+
+        """
+        nbr_msg = self.get_rolling_window(window)['nbr_msg']
+        index = {p: i for i, p in enumerate(self.p)}
+        msg_cumsum = self.day_cube[self.day_cube_metrics.index('msg')]
+        nbr_msg_p = rolling_sum(msg_cumsum[[index[p] for p in participants]], window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(nbr_msg > 0, nbr_msg_p / nbr_msg, 0.0)
+        return share, np.clip(1 - share.sum(axis=0), 0, 1)
+
+    def get_activity_tensor(self):
+        """Counts messages of every participant by weekday and hour.
+
+        Hour is rounded to the nearest full hour (23:30 counts as 0).
+
+        Returns:
+            np.ndarray: Array of shape (participants, 7, 24), indexed
+                like `p`, weekday (Monday is 0) and hour.
+
+        """
+        days, seconds = np.divmod(self.local_seconds, 86400)
+        weekday = (days + 3) % 7 # 1970-01-01 was Thursday
+        hour, rest = np.divmod(seconds, 3600)
+        # Round half to even, same as round() of fractional hour
+        hour = (hour + (rest > 1800) + ((rest == 1800) & (hour % 2 == 1))) % 24
+        index = (self.sender_codes * 7 + weekday) * 24 + hour
+        return np.bincount(index, minlength=len(self.p) * 7 * 24).reshape(len(self.p), 7, 24)
+
     def get_timeline(self):
         """Fetches data when messages are sent.
 
@@ -363,40 +769,11 @@ class FacebookMessengerConversation():
                 how many were sent per day, weekday and hour.
 
         """
-        timeline = [None] * self.nbr_days
-        hour = list(range(24))
-        weekday_arr = [0, 1, 2, 3, 4, 5, 6]
-        nbr_times_hour = [0] * 24
-        nbr_times_weekday = [0] * 7
-        nbr_times_day = [0] * self.nbr_days
-        current_day = self.time_end.date()
-        index = len(timeline) - 1
-        timeline[index] = current_day
-        nbr_times_day[index] = 1
-        for message in self.data['messages']:
-            current = datetime.fromtimestamp(
-                message['timestamp_ms']/1000)
-            h = int(round(current.hour + current.minute/60. +\
-                current.second/3600))
-            if h == 24:
-                h = 0
-            nbr_times_hour[h] = nbr_times_hour[h] + 1
-            wd = current.weekday()
-            nbr_times_weekday[wd] = nbr_times_weekday[wd] + 1
-            current = current.date()
-            if current == current_day:
-                nbr_times_day[index] = nbr_times_day[index] + 1
-            elif current < current_day:
-                diff = (current_day - current).days
-                index = index - diff
-                current_day = current
-                timeline[index] = current_day
-                nbr_times_day[index] = 1
-        dates = [None] * len(timeline)
-        for i in range(0, len(timeline)):
-            if timeline[i] == None:
-                timeline[i] = timeline[i - 1] + timedelta(days=1)
-            dates[i] = timeline[i].strftime('%Y-%m-%d')
+        first_day = self.time_start.date()
+        timeline = [first_day + timedelta(days=i) for i in range(self.nbr_days)]
+        nbr_times_day = np.bincount(self.day_index, minlength=self.nbr_days).tolist()
+        nbr_times_weekday = self.activity_tensor.sum(axis=(0, 2)).tolist()
+        nbr_times_hour = self.activity_tensor.sum(axis=(0, 1)).tolist()
         return timeline, nbr_times_day, nbr_times_weekday, nbr_times_hour
 
     def get_top_emojis(self, nbr):
@@ -455,24 +832,23 @@ class FacebookMessengerConversation():
 
 
         """
-        all_emojis_count = {p: 0 for p in self.p}
+        # Every distinct reaction is demojized once, reactions are counted per (actor, emoji id)
+        used = set(self.__used_reaction_emojis_list)
+        names = [emoji.demojize(e) for e in self.reaction_emojis]
+        valid = np.array([name in used for name in names], dtype=bool)
+        mask = (self.reaction_actor_codes >= 0) & valid[self.reaction_emoji_ids] if len(names) else np.zeros(0, dtype=bool)
+        nbr_p, nbr_e = len(self.p), len(names)
+        counts = np.bincount(self.reaction_actor_codes[mask] * nbr_e + self.reaction_emoji_ids[mask],
+                             minlength=nbr_p * nbr_e).reshape(nbr_p, nbr_e)
+
         emojis = {e: 0 for e in self.__used_reaction_emojis_list}
-        emojis_p = {p: 0 for p in self.p}
-        for p in emojis_p:
-            emojis_p[p] = {e: 0 for e in self.__used_reaction_emojis_list}
-        for message in self.data['messages']:
-            if 'reactions' in message:
-                for reaction in message['reactions']:
-                    try:
-                        actor = reaction['actor']
-                        emoji_str = emoji.demojize(reaction['reaction'])
-                        if emoji_str in emojis and actor in emojis_p:
-                            emojis_p[actor][emoji_str] += 1
-                            emojis[emoji_str] += 1
-                            all_emojis_count[actor] += 1
-                    except KeyError:
-                        pass
-                    
+        emojis_p = {p: {e: 0 for e in self.__used_reaction_emojis_list} for p in self.p}
+        for e, name in enumerate(names):
+            if valid[e]:
+                emojis[name] += int(counts[:, e].sum())
+                for i, p in enumerate(self.p):
+                    emojis_p[p][name] += int(counts[i, e])
+        all_emojis_count = dict(zip(self.p, counts.sum(axis=1).tolist()))
 
         top_emojis = {emoji_key : {} for emoji_key, count in sorted(emojis.items(),
                                                             key=lambda kv: (-kv[1], kv[0]))[:nbr]}
@@ -491,6 +867,9 @@ class FacebookMessengerConversation():
     def __top_chars(self):
         """Creates dict of characters used in messages and sorts them by count
         """
+        if self.approximate:
+            self.__top_chars_approximate()
+            return
         characters = {c: 0 for c in set(''.join([message['content'].lower() for message in self.data['messages'] if 'content' in message])) if c not in self.__emojis_str}
         if ' ' in characters: 
             characters.pop(' ')
@@ -504,6 +883,18 @@ class FacebookMessengerConversation():
                            key=lambda kv: (-kv[1], kv[0]))}
     
 
+    def __top_chars_approximate(self):
+        """Creates dict of the most used characters with Space-Saving heavy hitters
+        """
+        characters = SpaceSaving(self.sketch_capacity)
+        excluded = set(self.__emojis_str + ' ')
+        for message in self.data['messages']:
+            if 'content' in message:
+                for c, count in Counter(message['content'].lower()).items():
+                    if c not in excluded:
+                        characters.add(c, count)
+        self.top_chars = dict(characters.top(self.sketch_capacity))
+
     def __top_words_deprecated(self):
         """Creates dict of words used in messages and sorts them by count
         """
@@ -528,6 +919,9 @@ class FacebookMessengerConversation():
     def __top_words(self):
         """Creates dict of words used by participants in messages and sorts them by count
         """
+        if self.approximate:
+            self.__top_words_approximate()
+            return
         words_p = {p: {} for p in self.p}
         words = {}
         for message in self.data['messages']:
@@ -555,6 +949,37 @@ class FacebookMessengerConversation():
                            key=lambda kv: (-kv[1], kv[0]))} for p in self.p}
         self.top_words = {word_key: count for word_key, count in sorted(words.items(),
                            key=lambda kv: (-kv[1], kv[0]))}
+        self.nbr_distinct_words = len(self.top_words)
+        self.nbr_distinct_words_p = {p: len(self.top_words_p[p]) for p in self.p}
+
+    def __top_words_approximate(self, batch_size=10000):
+        """Creates dicts of the most used words with sketches, memory does not depend on vocabulary size
+
+        Words are counted exactly only within a batch of `batch_size` messages.
+        """
+        strip = self.__emojis_str + self.words_strip
+        self.words_sketch = WordSketch(self.sketch_epsilon, self.sketch_delta, self.sketch_capacity)
+        self.words_sketch_p = {p: WordSketch(capacity=self.sketch_capacity, precision=12, count_min=False) for p in self.p}
+        messages = [message for message in self.data['messages'] if 'content' in message]
+        for i in range(0, len(messages), batch_size):
+            words_p = {}
+            for message in messages[i:i + batch_size]:
+                words = words_p.setdefault(message['sender_name'], Counter())
+                for word in message['content'].split():
+                    word = word.strip(strip)
+                    if len(word) == 0:
+                        continue
+                    if word not in self.words_not_lower:
+                        word = word.lower()
+                    words[word] += 1
+            for p in words_p:
+                self.words_sketch_p[p].update(words_p[p])
+            self.words_sketch.update(sum(words_p.values(), Counter()))
+
+        self.top_words = self.words_sketch.top(self.nbr_top_words)
+        self.top_words_p = {p: self.words_sketch_p[p].top(self.nbr_top_words) for p in self.p}
+        self.nbr_distinct_words = self.words_sketch.nbr_distinct()
+        self.nbr_distinct_words_p = {p: self.words_sketch_p[p].nbr_distinct() for p in self.p}
 
     def top_participants_in_messages(self, nbr):
         """Returns the top `nbr` participants who sent the most messages, last is rest
@@ -566,10 +991,10 @@ class FacebookMessengerConversation():
             Dict showing the top participants who sent the most messages with their counts
 
         """
-        top_participants_in_messages = {p: self.nbr_msg_p[p] for p in list(self.nbr_msg_p)[:nbr]}
-
-        if len(self.p) > nbr:
-            top_participants_in_messages['Rest'] = self.nbr_msg - sum(top_participants_in_messages.values())
+        values, participants, rest = top_with_rest(self.nbr_msg_p.values(), self.nbr_msg_p.keys(), nbr)
+        top_participants_in_messages = dict(zip(participants, values))
+        if rest is not None:
+            top_participants_in_messages['Rest'] = rest
         return top_participants_in_messages
 
     def top_participants_in_words(self, nbr):
@@ -582,10 +1007,10 @@ class FacebookMessengerConversation():
             Dict showing the top participants who used the most words with their counts
 
         """
-        top_participants_in_words = {p: self.nbr_words_p[p] for p in list(self.nbr_words_p)[:nbr]}
-
-        if len(self.p) > nbr:
-            top_participants_in_words['Rest'] = self.nbr_words - sum(top_participants_in_words.values())
+        values, participants, rest = top_with_rest(self.nbr_words_p.values(), self.nbr_words_p.keys(), nbr)
+        top_participants_in_words = dict(zip(participants, values))
+        if rest is not None:
+            top_participants_in_words['Rest'] = rest
         return top_participants_in_words
    
     def top_participants_in_characters(self, nbr):
@@ -598,10 +1023,10 @@ class FacebookMessengerConversation():
             Dict showing the top participants who used the most characters with their counts
 
         """
-        top_participants_in_characters = {p: self.nbr_chars_p[p] for p in list(self.nbr_chars_p)[:nbr]}
-
-        if len(self.p) > nbr:
-            top_participants_in_characters['Rest'] = self.nbr_chars - sum(top_participants_in_characters.values())
+        values, participants, rest = top_with_rest(self.nbr_chars_p.values(), self.nbr_chars_p.keys(), nbr)
+        top_participants_in_characters = dict(zip(participants, values))
+        if rest is not None:
+            top_participants_in_characters['Rest'] = rest
         return top_participants_in_characters
    
     def top_participants_in_editions(self, nbr):
@@ -615,10 +1040,10 @@ class FacebookMessengerConversation():
 
         """
 
-        top_participants_in_editions = {p: self.nbr_editions_p[p] for p in list(self.nbr_editions_p)[:nbr]}
-
-        if len(self.p) > nbr:
-            top_participants_in_editions['Rest'] = self.nbr_editions - sum(top_participants_in_editions.values())
+        values, participants, rest = top_with_rest(self.nbr_editions_p.values(), self.nbr_editions_p.keys(), nbr)
+        top_participants_in_editions = dict(zip(participants, values))
+        if rest is not None:
+            top_participants_in_editions['Rest'] = rest
         return top_participants_in_editions
     
 
@@ -662,41 +1087,352 @@ class FacebookMessengerConversation():
         self.nbr_stickers_p = dict(sorted(self.nbr_stickers_p.items(), key=lambda item: item[1], reverse=True))
         self.nbr_shares_p = dict(sorted(self.nbr_shares_p.items(), key=lambda item: item[1], reverse=True))      
 
-    def __timeline_statistics(self):
-        days = set()
-        activity_timeline = [0] * self.nbr_days
-        nbr_active_days = 0
-        for message in reversed(self.data['messages']):
-            current_date = datetime.fromtimestamp(message['timestamp_ms']/1000).date()
-            current_day_nbr = (current_date - self.time_start.date()).days
-            if current_date not in days:
-                days.add(current_date)
-                nbr_active_days += 1
-                activity_timeline[current_day_nbr] = nbr_active_days
-        
-        for i in range(self.nbr_days):
-            if activity_timeline[i] == 0:
-                activity_timeline[i] = activity_timeline[i-1]
+    def create_conversation_txt(self, chronological=False, compression=None, batch_size=10000):
+        """Creates a text file with messages from the conversation
 
-        self.activity_timeline = [x / (i + 1) for i, x in enumerate(activity_timeline)]
+        Lines are formatted from the precomputed local times with date
+        prefixes cached per day and written in batches.
+
+        Args:
+            chronological (bool): Write the oldest message first instead of
+                the newest one as in the export.
+            compression (str): None, 'gzip', 'bz2' or 'xz'.
+            batch_size (int): Number of lines joined into one write.
+
+        Returns:
+            str: Path to the written file.
 
-    def create_conversation_txt(self):
-        """Creates a text file with messages from the conversation
         """
-        filename = self.data['title'] + '_conversation.txt'
-        with open('results/' + filename, 'w', encoding='utf-8') as f:
-            for message in self.data['messages']:
-                time = datetime.fromtimestamp(message['timestamp_ms']/1000).strftime('%Y-%m-%d %H:%M:%S')
-                string = time + ' ' + message['sender_name']
+        openers = {None: open, 'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+        extensions = {None: '', 'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz'}
+        if compression not in openers:
+            raise ValueError('Unknown compression {}, expected one of {}'.format(compression, list(openers)[1:]))
+        media = [('photos', 'a photo', 'photos'), ('videos', 'a video', 'videos'), ('gifs', 'a GIF', 'GIFs'),
+                 ('audio_files', 'an audio file', 'audio files'), ('files', 'a file', 'files'),
+                 ('sticker', 'a sticker', 'stickers'), ('share', 'a link', 'links')]
+
+        messages = self.data['messages']
+        order = range(len(messages) - 1, -1, -1) if chronological else range(len(messages))
+        days = (self.local_seconds // 86400).tolist()
+        seconds = (self.local_seconds % 86400).tolist()
+        date_prefixes = {}
+
+        path = os.path.join('results', self.output_name + '_conversation.txt' + extensions[compression])
+        if not os.path.exists('results'):
+            os.makedirs('results')
+        with openers[compression](path, 'wt', encoding='utf-8') as f:
+            lines = []
+            for i in order:
+                message = messages[i]
+                day = days[i]
+                prefix = date_prefixes.get(day)
+                if prefix is None:
+                    prefix = date_prefixes[day] = (datetime(1970, 1, 1) + timedelta(days=day)).strftime('%Y-%m-%d ')
+                second = seconds[i]
+                line = '{}{:02d}:{:02d}:{:02d} {}'.format(prefix, second // 3600, second // 60 % 60, second % 60, message['sender_name'])
                 if 'content' in message:
-                    string += ': ' + message['content']
-                elif 'photos' in message:
-                    string += ' sent a photo'
-                elif 'files' in message:
-                    string += ' sent a file'
-                f.write(string + '\n')
+                    line += ': ' + message['content']
+                else:
+                    for kind, one, many in media:
+                        if kind in message:
+                            count = len(message[kind]) if isinstance(message[kind], list) else 1
+                            line += ' sent ' + (one if count == 1 else '{} {}'.format(count, many))
+                            break
+                    else:
+                        if 'is_unsent' in message:
+                            line += ' unsent a message'
+                lines.append(line)
+                if len(lines) >= batch_size:
+                    lines.append('')
+                    f.write('\n'.join(lines))
+                    lines = []
+            if lines:
+                lines.append('')
+                f.write('\n'.join(lines))
+        return path
+
+    def save_snapshot(self, path):
+        """Saves computed statistics without the messages to a compressed snapshot.
+
+        Reports can be rendered from the snapshot with `load_snapshot`
+        without reading and processing the conversation again.
+
+        Args:
+            path (str): Path to the snapshot file.
+
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with gzip.open(path, 'wb', compresslevel=6) as f:
+            pickle.dump(self.snapshot_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load_snapshot(cls, path):
+        """Restores a conversation saved with `save_snapshot`.
+
+        Args:
+            path (str): Path to the snapshot file.
+
+        Returns:
+            FacebookMessengerConversation: Conversation with computed statistics.
+
+        """
+        with gzip.open(path, 'rb') as f:
+            return cls.from_snapshot_state(pickle.load(f))
+
+    def snapshot_state(self):
+        """Returns picklable computed statistics without the messages.
+        """
+        state = {key: value for key, value in vars(self).items() if key != 'data'}
+        state['day_cube'] = np.diff(self.day_cube, axis=2) # Daily counts compress much better than cumulative ones
+        state['_FacebookMessengerConversation__rolling_cache'] = {}
+        return {'version': self.snapshot_version, 'class': type(self).__name__, 'state': state}
+
+    @classmethod
+    def from_snapshot_state(cls, snapshot):
+        """Restores a conversation from `snapshot_state`.
+
+        Messages are not restored, so `data` is None and only methods using
+        computed statistics (reports, `range_statistics`...) can be used.
+        """
+        if snapshot.get('version') != cls.snapshot_version:
+            raise ValueError('Snapshot version {} is not supported, expected {}'.format(snapshot.get('version'), cls.snapshot_version))
+
+        state = dict(snapshot['state'])
+        daily = state['day_cube']
+        state['day_cube'] = np.concatenate((np.zeros(daily.shape[:2] + (1,), dtype=daily.dtype), np.cumsum(daily, axis=2)), axis=2)
+        conversation = cls.__new__(cls)
+        conversation.__dict__.update(state)
+        conversation.data = None
+        return conversation
 
 
 def truncate(n, decimals=0):
     multiplier = 10**decimals
-    return math.floor(n * multiplier) / multiplier
\ No newline at end of file
+    return math.floor(n * multiplier) / multiplier
+
+def local_seconds(timestamps_ms):
+    """Converts timestamps to seconds since epoch in local time.
+
+    UTC offset is looked up once per unique quarter of an hour, offsets
+    (including DST changes) do not change within it.
+
+    Args:
+        timestamps_ms (np.ndarray): Timestamps in milliseconds.
+
+    Returns:
+        np.ndarray: Local time in seconds, same as `datetime.fromtimestamp`.
+
+    """
+    seconds = timestamps_ms // 1000
+    quarters, inverse = np.unique(seconds // 900, return_inverse=True)
+    offsets = np.array([time.localtime(int(q) * 900).tm_gmtoff for q in quarters], dtype=np.int64)
+    return seconds + offsets[inverse.reshape(-1)]
+
+def rolling_sum(cumulative, window):
+    """Returns sums of trailing `window` elements from cumulative sums.
+
+    Args:
+        cumulative (np.ndarray): Cumulative sums along the last axis
+            starting with 0, one element longer than the series.
+        window (int): Number of elements in the window.
+
+    Returns:
+        np.ndarray: Sum of up to `window` last elements ending at every element.
+
+    """
+    n = cumulative.shape[-1] - 1
+    return cumulative[..., 1:] - cumulative[..., np.maximum(np.arange(1, n + 1) - window, 0)]
+
+def top_n(values, nbr):
+    """Returns indices of the `nbr` largest `values`, largest first.
+
+    Candidates are selected with `np.argpartition` in linear time and only
+    they are sorted. Ties keep the order of `values`, like slicing a stably
+    sorted list would.
+    """
+    values = np.asarray(values)
+    if nbr <= 0 or len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if nbr < len(values):
+        kth = values[np.argpartition(-values, nbr - 1)[nbr - 1]]
+        above = np.flatnonzero(values > kth)
+        candidates = np.concatenate((above, np.flatnonzero(values == kth)[:nbr - len(above)]))
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
+def top_with_rest(values, labels, nbr, min_percentage=0.0):
+    """Returns the `nbr` largest `values`, their `labels` and the sum of the other values.
+
+    Values below `min_percentage` of the total are also added to the rest.
+
+    Returns:
+        tuple: Top values and labels, largest first, and the rest, None if
+            there are no more than `nbr` values (they are returned unchanged).
+
+    """
+    values, labels = np.asarray(list(values)), list(labels)
+    if len(values) <= nbr:
+        return values.tolist(), labels, None
+    total = values.sum()
+    top = top_n(values, nbr)
+    top = top[values[top] >= total * min_percentage / 100]
+    return values[top].tolist(), [labels[i] for i in top], (total - values[top].sum()).item()
+
+def part_folder(part):
+    """Returns name of the folder of conversation `part`, a path or a member of an export archive.
+    """
+    name = os.path.abspath(part) if isinstance(part, str) else part.name
+    return os.path.basename(os.path.dirname(name))
+
+def repair_mojibake(buffer):
+    """Returns JSON bytes `buffer` with UTF-8 bytes escaped one by one replaced by the bytes.
+
+    Strings parsed from the result are proper unicode, the same as
+    `s.encode('raw_unicode_escape').decode('utf-8')` of every string
+    parsed from `buffer`, without copying each of them twice.
+    """
+    # The same characters repeat in the whole conversation, their bytes are decoded once
+    unescaped = {b'\\\\': b'\\\\'}
+    def unescape(match):
+        escaped = match.group()
+        if escaped not in unescaped:
+            unescaped[escaped] = bytes.fromhex(escaped.replace(b'\\u00', b'').decode('ascii'))
+        return unescaped[escaped]
+    return ESCAPED_BYTES.sub(unescape, buffer)
+
+def repair_chunks(chunks, size=0):
+    """Returns consecutive `chunks` of JSON bytes repaired by `repair_mojibake` as one bytearray.
+
+    Repairing only shortens the bytes, so repaired chunks are written one
+    after another to a bytearray of `size` bytes (total size of the chunks
+    when known) truncated at the end, the file is never held twice.
+    Escapes split between chunks are repaired with the next chunk.
+    """
+    repaired = bytearray(size)
+    end = 0
+    pending = b''
+    for chunk in chunks:
+        chunk = pending + chunk
+        cut = chunk.rfind(b'\\')
+        if cut < 0:
+            cut = len(chunk)
+        while cut > 0 and chunk[cut - 1] == 0x5c: # The whole run of backslashes waits for the next chunk
+            cut -= 1
+        chunk, pending = repair_mojibake(chunk[:cut]), chunk[cut:]
+        repaired[end:end + len(chunk)] = chunk # Grows the bytearray only if `size` is unknown
+        end += len(chunk)
+    chunk = repair_mojibake(pending)
+    repaired[end:end + len(chunk)] = chunk
+    del repaired[end + len(chunk):]
+    return repaired
+
+def repair_text(text):
+    """Returns `text` parsed from Facebook JSON with its UTF-8 bytes (characters up to U+00FF) decoded.
+    """
+    if text.isascii():
+        return text
+    try:
+        return text.encode('latin-1').decode('utf-8')
+    except UnicodeEncodeError: # Characters above U+00FF were not escaped bytes and are kept
+        return MOJIBAKE_RUN.sub(lambda run: run.group().encode('latin-1').decode('utf-8'), text)
+
+def repair_object(obj):
+    """`object_hook` of json repairing strings of every parsed object and its lists of strings.
+    """
+    for key, value in obj.items():
+        if isinstance(value, str):
+            obj[key] = repair_text(value)
+        elif isinstance(value, list) and value and isinstance(value[0], str):
+            obj[key] = [repair_text(item) for item in value]
+    return obj
+
+def read_json_part(part, chunk_size=1 << 20):
+    """Reads and parses a part of a conversation (path or ArchiveMember) repairing its text.
+
+    Files are memory-mapped and read in chunks of `chunk_size` bytes,
+    parts that can not be mapped (archive members, empty files) are read
+    in chunks of the same size. With orjson a mapped file without escaped
+    bytes is parsed directly, otherwise the chunks are repaired by
+    `repair_chunks` and parsed from its bytearray, orjson does not copy
+    it. Without orjson the chunks are decoded to one string, which stays
+    1 byte per character while its text is escaped, and its strings are
+    repaired while it is parsed.
+    """
+    with open_part(part) as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            mapped = None
+            chunks = iter(lambda: f.read(chunk_size), b'')
+        else:
+            chunks = (mapped[i:i + chunk_size] for i in range(0, len(mapped), chunk_size))
+        try:
+            if orjson is not None and mapped is not None and mapped.find(b'\\u00') < 0:
+                with memoryview(mapped) as view: # Released before the file is unmapped
+                    return orjson.loads(view)
+            if orjson is not None:
+                data = repair_chunks(chunks, len(mapped) if mapped is not None else 0)
+            else:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+                data = ''.join([decoder.decode(chunk) for chunk in chunks] + [decoder.decode(b'', final=True)])
+        finally:
+            if mapped is not None:
+                mapped.close()
+    if orjson is not None:
+        # A truncated bytearray keeps its whole allocation, bytes of the repaired size use less memory while parsing
+        data = bytes(data)
+        return orjson.loads(data)
+    return json.loads(data, object_hook=repair_object)
+
+def message_key(message):
+    """Returns (timestamp, sender, hash of content) identifying a message.
+
+    Messages without text are hashed with all their fields except reactions.
+    """
+    content = message.get('content')
+    if content is None:
+        content = repr(sorted((key, value) for key, value in message.items() if key != 'reactions'))
+    return message['timestamp_ms'], message.get('sender_name'), hash(content)
+
+def drop_repeated_messages(parts):
+    """Removes messages of later `parts` (data of conversation parts) repeated in earlier ones.
+
+    Exports sometimes repeat messages at the border of two parts. Only
+    messages in time ranges shared with other parts are compared by
+    `message_key`, messages of one part are never removed as repeated.
+    """
+    timestamps = [np.array([message['timestamp_ms'] for message in part['messages']], dtype=np.int64) for part in parts]
+    ranges = [(t.min(), t.max()) if len(t) else None for t in timestamps]
+    seen = set()
+    for i, part in enumerate(parts):
+        if ranges[i] is None:
+            continue
+        shared = np.zeros(len(timestamps[i]), dtype=bool)
+        for j, other in enumerate(ranges):
+            if j != i and other is not None and other[0] <= ranges[i][1] and ranges[i][0] <= other[1]:
+                shared |= (timestamps[i] >= other[0]) & (timestamps[i] <= other[1])
+        if not shared.any():
+            continue
+        keys = {}
+        messages = []
+        for message, is_shared in zip(part['messages'], shared):
+            if is_shared:
+                key = message_key(message)
+                if key in seen:
+                    continue
+                keys[key] = None
+            messages.append(message)
+        part['messages'] = messages
+        seen.update(keys)
+
+def to_date(day):
+    """Returns `day` ('YYYY-MM-DD', date or datetime) as date.
+    """
+    if isinstance(day, str):
+        return datetime.strptime(day, '%Y-%m-%d').date()
+    if isinstance(day, datetime):
+        return day.date()
+    return day
\ No newline at end of file
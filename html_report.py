@@ -0,0 +1,340 @@
+import html
+import math
+import os
+from datetime import datetime
+import numpy as np
+from facebook_messenger_conversation import top_with_rest
+
+# Colors of matplotlib tab10 palette, same as in PDF reports
+colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+width, height = 640, 320
+left, right, top, bottom = 60, 15, 35, 50
+
+style = '''
+body { font-family: Arial, 'Segoe UI Emoji', sans-serif; max-width: 900px; margin: 0 auto; padding: 20px; color: #222; }
+h1 { font-size: 22px; } h2 { font-size: 18px; margin-top: 40px; }
+svg { display: block; margin: 10px 0; } svg text { font-size: 11px; }
+pre { font-size: 13px; line-height: 1.4; }
+table { border-collapse: collapse; font-size: 13px; } td, th { padding: 2px 12px 2px 0; text-align: left; }
+'''
+
+def generate_html(conversation, path=None, max_participants=10):
+    """Renders the report of `conversation` as a self-contained HTML file with inline SVG charts.
+
+    Charts are generated directly from statistics arrays with string
+    templates, matplotlib is not used.
+
+    Args:
+        conversation (FacebookMessengerConversation): Computed conversation.
+        path (str): Path to the output file, defaults to results/<output_name>.html.
+        max_participants (int): Number of participants shown on plots, the others are grouped as Rest.
+
+    Returns:
+        str: Path to the written file.
+
+    """
+    c = conversation
+    if path is None:
+        path = os.path.join('results', c.output_name + '.html')
+    top_p = c.top_participants(max_participants)
+    p_index = {p: i for i, p in enumerate(c.p)}
+    sections = []
+
+    # Participants shares
+    for title, nbr_p, always in [('Messages', c.nbr_msg_p, True), ('Words', c.nbr_words_p, True), ('Characters', c.nbr_chars_p, True),
+                                 ('Unsent messages', c.nbr_unsent_msg_p, False), ('Photos', c.nbr_photos_p, False),
+                                 ('Videos', c.nbr_videos_p, False), ('Gifs', c.nbr_gifs_p, False), ('Stickers', c.nbr_stickers_p, False),
+                                 ('Files', c.nbr_files_p, False), ('Audio', c.nbr_audio_p, False), ('Shares', c.nbr_shares_p, False),
+                                 ('Editions', c.nbr_editions_p, False)]:
+        if always or sum(nbr_p.values()) > 0:
+            sections.append(svg_pie(title, *with_rest(list(nbr_p.values()), list(nbr_p.keys()), max_participants)))
+
+    # Timelines
+    dates = [day.strftime('%Y-%m-%d') for day in c.timeline]
+    sections.append(svg_timeline('Timeline', dates, 'Number of messages', bars=c.nbr_times_day,
+                                 lines=[('{}-day average'.format(window), c.get_rolling_window(window)['avg_msg_per_day'])
+                                        for window in c.rolling_windows[:2]]))
+    sections.append(svg_timeline('Active days timeline', dates, 'Percentage', percent=True,
+                                 lines=[('Since start', c.activity_timeline)] + [('Last {} days'.format(window), c.get_rolling_window(window)['active_days_ratio'])
+                                                                                for window in c.rolling_windows[1:]]))
+    if len(c.p) > 1:
+        window = c.rolling_windows[1]
+        share, rest = c.get_rolling_share(window, top_p)
+        shares = list(zip(top_p, share))
+        if len(c.p) > len(top_p):
+            shares.append(('Rest', rest))
+        sections.append(svg_timeline('Share of messages (last {} days)'.format(window), dates, 'Percentage', percent=True, stack=shares))
+
+    # Activity
+    sections.append(svg_bars('Activity by Hour', [str(h) for h in range(24)], [('', c.nbr_times_hour)], 'Number of messages'))
+    weekday_labels = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    sections.append(svg_bars('Activity by Weekday', weekday_labels, [('', c.nbr_times_weekday)], 'Number of messages'))
+    sections.append('<h2>Activity by Weekday and Hour</h2>' + ''.join(svg_heatmap(p, c.activity_tensor[p_index[p]], weekday_labels) for p in top_p))
+
+    # Reply times
+    intervals = np.array([1.0 * (1.294 ** i) for i in range(45)])
+    reply_series = [(p, reply_histogram(c.reply_times_p[p], intervals)) for p in c.p] if len(c.p) <= max_participants else [('', reply_histogram(c.reply_times, intervals))]
+    sections.append(svg_bars('Reply times', [format_duration(i) for i in intervals], reply_series, 'Number of messages', label_step=4))
+
+    # Days per number of messages
+    intervals = [0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 100000]
+    intervals_labels = ['0', '1-10', '10-25', '25-50', '50-100', '100-250', '250-500', '500-1000', '1000-2500', '2500-5000', '5000-10000', '>10000']
+    val = np.bincount(np.searchsorted(intervals, c.nbr_times_day), minlength=len(intervals))[:len(intervals)]
+    last = max(int(np.nonzero(val)[0].max()) if val.any() else 0, 1)
+    sections.append(svg_bars('Days per number of messages', intervals_labels[1:last + 1], [('', val[1:last + 1])], 'Number of days'))
+
+    # Messages in a row
+    if len(c.p) <= max_participants:
+        labels = [str(i) for i in c.nbr_msg_in_row_p[c.p[0]].keys()]
+        sections.append(svg_bars('Messages in a row', labels, [(p, list(c.nbr_msg_in_row_p[p].values())) for p in c.p], 'Count'))
+
+    # Emojis
+    for title, top, all_count in [('Top {} emojis'.format(c.nbr_top_emojis), c.top_emojis, c.emojis_all_count),
+                                  ('Top {} reactions emojis'.format(c.nbr_top_emojis), c.top_reactions_emojis, c.emojis_reactions_all_count)]:
+        if not top:
+            continue
+        if len(c.p) <= max_participants:
+            series = [(p, [top[e][p] for e in top]) for p in all_count]
+        else:
+            series = [('', [top[e]['all'] for e in top])]
+        sections.append(svg_bars(title, list(top.keys()), series, 'Number of times used'))
+    sections.append(svg_pie('Top {} characters'.format(c.nbr_top_characters), *with_rest(list(c.top_chars.values()), list(c.top_chars.keys()), c.nbr_top_characters)))
+
+    # Text statistics
+    text_stats = [
+        'Start: {}'.format(c.time_start_str),
+        'End: {}'.format(c.time_end_str),
+        'Number of days: {}'.format(c.nbr_days),
+        'Number of active days: {} ({:.3} %)'.format(c.nbr_days_active, 100*c.nbr_days_active/c.nbr_days),
+        'Number of active days in row: {} ({} : {})'.format(c.nbr_days_active_in_row, c.time_start_days_active_in_row_str, c.time_end_days_active_in_row_str),
+        'Number of inactive days in row: {} ({} : {})'.format(c.nbr_days_inactive_in_row, c.time_start_days_inactive_in_row_str, c.time_end_days_inactive_in_row_str),
+        'Most messages in one day: {}'.format(max(c.nbr_times_day)),
+        'Number of messages: {}'.format(c.nbr_msg),
+        'Number of words: {}'.format(c.nbr_words),
+        'Number of characters: {}'.format(c.nbr_chars),
+        '',
+        'Average length of messages: {:.1f} words'.format(c.avg_words_per_msg),
+        'Average length of messages: {:.1f} characters'.format(c.avg_chars_per_msg),
+        'Average length of word: {:.1f} characters'.format(c.avg_chars_per_word),
+        'Average messages per day: {:.1f}'.format(c.avg_msg_per_day),
+        'Average reply time: {:.1f} seconds ({:.0f}h {:.0f}min) (rejecting >1day)'.format(c.avg_reply_time, c.avg_reply_time // 3600, (c.avg_reply_time % 3600) // 60),
+        'Median reply time: {:.1f} seconds'.format(c.median_reply_time),
+        '',
+        'Number of unsent messages: {}'.format(c.nbr_unsent_msg),
+        'Number of editions: {}'.format(c.nbr_editions),
+        'Number of photos: {}'.format(c.nbr_photos),
+        'Number of videos: {}'.format(c.nbr_videos),
+        'Number of gifs: {}'.format(c.nbr_gifs),
+        'Number of stickers: {}'.format(c.nbr_stickers),
+        'Number of files: {}'.format(c.nbr_files),
+        'Number of audio: {}'.format(c.nbr_audio),
+        'Number of shares: {}'.format(c.nbr_shares),
+        '',
+        '   {: <20} {: >12} {: >12} {: >15} {: >18} {: >18}'.format('Participant', 'Words/msg', 'Chars/msg', 'Chars/word', 'Avg reply time', 'Median reply time'),
+    ]
+    for i, p in enumerate(top_p, 1):
+        text_stats.append('{}. {: <20}: {:>5.1f} w/msg{:>8.1f} ch/msg{:>7.1f} ch/w{:>11.0f} s{:>13.0f} s'.format(
+            i, p, c.avg_words_per_msg_p[p], c.avg_chars_per_msg_p[p], c.avg_chars_per_word_p[p], c.avg_reply_time_p[p], c.median_reply_time_p[p]))
+    text_stats.append('')
+    text_stats.append('   {: <20}    {: <20} {: >8} {: >10}'.format('Replier', 'Author', 'Replies', 'Median'))
+    for i, (p, q, count, median) in enumerate(c.top_reply_pairs(max_participants), 1):
+        text_stats.append('{}. {: <20} -> {: <20} {:>8} {:>8.0f} s'.format(i, p, q, count, median))
+    sections.append('<h2>Text Statistics</h2>\n<pre>{}</pre>'.format(html.escape('\n'.join(text_stats))))
+
+    # Top words
+    columns = [('All', c.top_words)] + [(p, c.top_words_p[p]) for p in top_p[:4]]
+    rows = ['<tr>' + ''.join('<th>{}</th>'.format(html.escape(name)) for name, _ in columns) + '</tr>']
+    for j in range(c.nbr_top_words):
+        cells = []
+        for _, words in columns:
+            items = list(words.items())
+            cells.append('<td>{}</td>'.format(html.escape('{}: {}'.format(*items[j])) if j < len(items) else ''))
+        rows.append('<tr>' + ''.join(cells) + '</tr>')
+    sections.append('<h2>Top words</h2>\n<table>\n{}\n</table>'.format('\n'.join(rows)))
+
+    names = 'Group chat: ' + c.title if len(c.p) > 2 else ', '.join(c.p)
+    document = '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{0}</title>\n<style>{1}</style>\n</head>\n<body>\n<h1>{0}</h1>\n<p>Generated {2}</p>\n{3}\n</body>\n</html>\n'.format(
+        html.escape(names), style, datetime.today().strftime('%Y-%m-%d %H:%M'), '\n'.join(sections))
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(document)
+    return path
+
+def with_rest(fracs, legend, max_on_plot, min_percentage=2.5):
+    """Groups values after the first `max_on_plot` (and the ones below `min_percentage`) as Rest, as PDF pie charts do.
+    """
+    fracs, legend, rest = top_with_rest(fracs, legend, max_on_plot, min_percentage)
+    if rest:
+        fracs, legend = fracs + [rest], legend + ['Rest']
+    return fracs, legend
+
+def reply_histogram(reply_times, intervals):
+    bins = np.searchsorted(intervals, reply_times)
+    return np.bincount(np.minimum(bins, len(intervals) - 1), minlength=len(intervals))
+
+def format_duration(seconds):
+    if seconds < 60:
+        return '{:.0f}s'.format(seconds)
+    if seconds < 3600:
+        return '{:.0f}min'.format(seconds // 60)
+    return '{:.0f}h'.format(seconds // 3600)
+
+def nice_ticks(max_value, nbr=5):
+    """Returns round y axis ticks from 0 covering `max_value`.
+    """
+    if max_value <= 0:
+        max_value = 1
+    raw = max_value / nbr
+    magnitude = 10 ** math.floor(math.log10(raw))
+    step = next(m for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw) * magnitude
+    return [step * i for i in range(int(math.ceil(max_value / step - 1e-9)) + 1)]
+
+def svg_axes(title, ylabel, ticks, percent=False):
+    """Returns SVG header with title, y axis label, ticks and grid.
+    """
+    plot_height = height - top - bottom
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" viewBox="0 0 {} {}">'.format(width, height, width, height),
+             '<text x="{}" y="20" text-anchor="middle" style="font-size:14px">{}</text>'.format(width / 2, html.escape(title)),
+             '<text transform="translate(14,{}) rotate(-90)" text-anchor="middle">{}</text>'.format(top + plot_height / 2, html.escape(ylabel))]
+    for tick in ticks:
+        y = top + plot_height * (1 - tick / ticks[-1])
+        label = '{:.0%}'.format(tick) if percent else '{:g}'.format(tick)
+        parts.append('<line x1="{}" x2="{}" y1="{:.1f}" y2="{:.1f}" stroke="#ccc" stroke-dasharray="3,3"/>'.format(left, width - right, y, y))
+        parts.append('<text x="{}" y="{:.1f}" text-anchor="end" dominant-baseline="middle">{}</text>'.format(left - 5, y, label))
+    parts.append('<line x1="{0}" x2="{0}" y1="{1}" y2="{2}" stroke="#000" stroke-width="0.5"/><line x1="{0}" x2="{3}" y1="{2}" y2="{2}" stroke="#000" stroke-width="0.5"/>'.format(
+        left, top, height - bottom, width - right))
+    return parts
+
+def svg_legend(names, x=None, offset=0):
+    """Returns SVG legend entries, colors start at `offset`.
+    """
+    x = width - right - 140 if x is None else x
+    parts = []
+    for i, name in enumerate(names):
+        parts.append('<rect x="{}" y="{}" width="10" height="10" fill="{}"/><text x="{}" y="{}">{}</text>'.format(
+            x, top + 14 * i, colors[(i + offset) % len(colors)], x + 14, top + 14 * i + 9, html.escape(str(name))))
+    return parts
+
+def svg_bars(title, labels, series, ylabel, label_step=1):
+    """Returns SVG with grouped bars, `series` is a list of (name, values).
+    """
+    plot_width, plot_height = width - left - right, height - top - bottom
+    ticks = nice_ticks(max(max(values, default=0) for _, values in series))
+    parts = svg_axes(title, ylabel, ticks)
+    slot = plot_width / max(len(labels), 1)
+    bar_width = 0.8 * slot / len(series)
+    for k, (_, values) in enumerate(series):
+        path = []
+        for i, value in enumerate(values):
+            if value > 0:
+                x = left + slot * (i + 0.1) + k * bar_width
+                h = plot_height * value / ticks[-1]
+                path.append('M{:.1f},{}v{:.1f}h{:.1f}v{:.1f}z'.format(x, height - bottom, -h, bar_width, h))
+        parts.append('<path d="{}" fill="{}"/>'.format(''.join(path), colors[k % len(colors)]))
+    for i, label in enumerate(labels):
+        if i % label_step == 0:
+            parts.append('<text x="{:.1f}" y="{}" text-anchor="middle">{}</text>'.format(left + slot * (i + 0.5), height - bottom + 15, html.escape(str(label))))
+    if len(series) > 1:
+        parts += svg_legend([name for name, _ in series])
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+def svg_timeline(title, dates, ylabel, bars=None, lines=(), stack=(), percent=False):
+    """Returns SVG with daily bars, lines or stacked areas over `dates`.
+
+    Args:
+        title (str): Title of the chart.
+        dates (list): Labels of days.
+        ylabel (str): Label of the y axis.
+        bars (list): Value of a bar for every day.
+        lines (list): (name, values) of lines.
+        stack (list): (name, values) of stacked areas.
+        percent (bool): Values are fractions, y axis ends at 100%.
+
+    """
+    plot_width, plot_height = width - left - right, height - top - bottom
+    if percent:
+        ticks = [0, 0.2, 0.4, 0.6, 0.8, 1.0]
+    else:
+        ticks = nice_ticks(max([max(bars, default=0) if bars is not None else 0] + [float(np.max(values)) for _, values in lines if len(values)]))
+    parts = svg_axes(title, ylabel, ticks, percent)
+    step = plot_width / max(len(dates), 1)
+
+    def y(values):
+        return height - bottom - plot_height * np.asarray(values, dtype=np.float64) / ticks[-1]
+
+    if bars is not None:
+        path = ['M{:.1f},{}V{:.1f}h{:.2f}V{}'.format(left + step * i, height - bottom, yi, step, height - bottom)
+                for i, (value, yi) in enumerate(zip(bars, y(bars))) if value > 0]
+        parts.append('<path d="{}" fill="{}"/>'.format(''.join(path), colors[0]))
+    xs = left + step * (np.arange(len(dates)) + 0.5)
+    baseline = np.zeros(len(dates))
+    for k, (_, values) in enumerate(stack):
+        upper = baseline + np.asarray(values, dtype=np.float64)
+        points = ['{:.1f},{:.1f}'.format(x, v) for x, v in zip(xs, y(upper))] + ['{:.1f},{:.1f}'.format(x, v) for x, v in zip(xs[::-1], y(baseline)[::-1])]
+        parts.append('<polygon points="{}" fill="{}"/>'.format(' '.join(points), colors[k % len(colors)]))
+        baseline = upper
+    offset = 1 if bars is not None else 0
+    for k, (_, values) in enumerate(lines):
+        points = ['{:.1f},{:.1f}'.format(x, v) for x, v in zip(xs, y(values))]
+        parts.append('<polyline points="{}" fill="none" stroke="{}" stroke-width="1"/>'.format(' '.join(points), colors[(k + offset) % len(colors)]))
+    for i in range(0, len(dates), max(len(dates) // 6, 1)):
+        parts.append('<text x="{:.1f}" y="{}" text-anchor="middle">{}</text>'.format(xs[i], height - bottom + 15, dates[i]))
+    if stack:
+        parts += svg_legend([name for name, _ in stack])
+    elif lines:
+        parts += svg_legend([name for name, _ in lines], offset=offset)
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+def svg_pie(title, fracs, legend):
+    """Returns SVG pie chart starting at the top and going counterclockwise, like PDF reports.
+    """
+    cx, cy, r = 200, height / 2 + 10, 120
+    total = sum(fracs)
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" viewBox="0 0 {} {}">'.format(width, height, width, height),
+             '<text x="{}" y="20" text-anchor="middle" style="font-size:14px">{}</text>'.format(cx, html.escape(title))]
+    angle = math.pi / 2
+    for i, value in enumerate(fracs):
+        if total <= 0 or value <= 0:
+            continue
+        sweep = 2 * math.pi * value / total
+        color = colors[i % len(colors)]
+        if sweep >= 2 * math.pi - 1e-9:
+            parts.append('<circle cx="{}" cy="{}" r="{}" fill="{}"/>'.format(cx, cy, r, color))
+        else:
+            x1, y1 = cx + r * math.cos(angle), cy - r * math.sin(angle)
+            x2, y2 = cx + r * math.cos(angle + sweep), cy - r * math.sin(angle + sweep)
+            parts.append('<path d="M{},{}L{:.1f},{:.1f}A{},{} 0 {} 0 {:.1f},{:.1f}z" fill="{}"/>'.format(
+                cx, cy, x1, y1, r, r, 1 if sweep > math.pi else 0, x2, y2, color))
+        middle = angle + sweep / 2
+        parts.append('<text x="{:.1f}" y="{:.1f}" text-anchor="middle" dominant-baseline="middle">{:.1f}%</text>'.format(
+            cx + 0.75 * r * math.cos(middle), cy - 0.75 * r * math.sin(middle), 100 * value / total))
+        angle += sweep
+    parts += svg_legend(legend, x=cx + r + 60)
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+def svg_heatmap(title, matrix, row_labels):
+    """Returns small SVG heatmap of weekday x hour activity.
+    """
+    cell, x0, y0 = 12, 40, 22
+    matrix = np.asarray(matrix, dtype=np.float64)
+    maximum = matrix.max() if matrix.max() > 0 else 1
+    rows, columns = matrix.shape
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" style="display:inline-block;margin-right:20px">'.format(
+                 x0 + cell * columns + 5, y0 + cell * rows + 18),
+             '<text x="{}" y="14">{}</text>'.format(x0, html.escape(title))]
+    for i in range(rows):
+        parts.append('<text x="{}" y="{}" text-anchor="end" dominant-baseline="middle">{}</text>'.format(x0 - 4, y0 + cell * (i + 0.5), row_labels[i][:3]))
+        for j in range(columns):
+            if matrix[i, j] > 0:
+                parts.append('<rect x="{}" y="{}" width="{}" height="{}" fill="{}" fill-opacity="{:.2f}"/>'.format(
+                    x0 + cell * j, y0 + cell * i, cell, cell, '#08519c', matrix[i, j] / maximum))
+    for j in range(0, columns, 3):
+        parts.append('<text x="{}" y="{}" text-anchor="middle">{}</text>'.format(x0 + cell * (j + 0.5), y0 + cell * rows + 13, j))
+    parts.append('</svg>')
+    return '\n'.join(parts)
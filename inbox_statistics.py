@@ -0,0 +1,225 @@
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import numpy as np
+from facebook_messenger_conversation import FacebookMessengerConversation
+from sketches import WordSketch
+from facebook_chat_statistics import banner, get_stats
+
+class InboxStatistics():
+    """Mergeable statistics of many Facebook Messenger conversations.
+
+    Each conversation is mapped to partial aggregates with `from_conversation`
+    and partials are combined with `merge`, so the whole inbox can be reduced
+    in any order without keeping conversations in memory.
+
+    Attributes:
+        nbr_conversations (int): Number of merged conversations.
+        nbr_msg_conversations (Counter): Number of messages per conversation folder.
+        conversation_titles (dict): Title of every conversation folder.
+        nbr_msg_p (Counter): Number of messages per participant.
+        nbr_words_p (Counter): Number of words per participant.
+        nbr_chars_p (Counter): Number of characters per participant.
+        nbr_times_day (Counter): Number of messages per day (date ordinal).
+        words (Counter or WordSketch): Number of uses of every word, a
+            bounded memory sketch in approximate mode.
+        emojis (Counter): Number of uses of every emoji.
+        emojis_p (Counter): Number of emojis per participant.
+        reply_times_hist (np.ndarray): Number of replies in `reply_times_bins`.
+
+    """
+
+    reply_times_bins = np.array([1.0 * (1.294 ** i) for i in range(45)])
+
+    def __init__(self, approximate=False):
+        self.approximate = approximate
+        self.nbr_conversations = 0
+        self.nbr_msg_conversations = Counter()
+        self.conversation_titles = {}
+        self.nbr_msg_p = Counter()
+        self.nbr_words_p = Counter()
+        self.nbr_chars_p = Counter()
+        self.nbr_times_day = Counter()
+        self.words = WordSketch() if approximate else Counter()
+        self.emojis = Counter()
+        self.emojis_p = Counter()
+        self.reply_times_hist = np.zeros(len(self.reply_times_bins), dtype=np.int64)
+
+    @classmethod
+    def from_conversation(cls, conversation):
+        """Creates partial aggregates of one conversation (map step).
+
+        Args:
+            conversation (FacebookMessengerConversation): Processed conversation.
+
+        Returns:
+            InboxStatistics: Statistics of `conversation` only.
+
+        """
+        stats = cls(conversation.approximate)
+        stats.nbr_conversations = 1
+        # Different conversations often have the same title, e.g. the name of the other participant
+        stats.nbr_msg_conversations[conversation.folder] = conversation.nbr_msg
+        stats.conversation_titles[conversation.folder] = conversation.title
+        stats.nbr_msg_p.update(conversation.nbr_msg_p)
+        stats.nbr_words_p.update(conversation.nbr_words_p)
+        stats.nbr_chars_p.update(conversation.nbr_chars_p)
+        stats.nbr_times_day.update({day.toordinal(): n for day, n in zip(conversation.timeline, conversation.nbr_times_day) if n})
+        if conversation.approximate:
+            stats.words = conversation.words_sketch
+        else:
+            stats.words.update(conversation.top_words)
+        top_emojis, emojis_all_count = conversation.get_top_emojis(sys.maxsize)
+        stats.emojis.update({e: top_emojis[e]['all'] for e in top_emojis})
+        stats.emojis_p.update(emojis_all_count)
+        bins = np.searchsorted(cls.reply_times_bins, conversation.reply_times)
+        stats.reply_times_hist += np.bincount(np.minimum(bins, len(cls.reply_times_bins) - 1), minlength=len(cls.reply_times_bins))
+        return stats
+
+    def merge(self, other):
+        """Adds aggregates of `other` to these statistics (reduce step).
+
+        Args:
+            other (InboxStatistics): Statistics to merge.
+
+        Returns:
+            InboxStatistics: self
+
+        """
+        self.nbr_conversations += other.nbr_conversations
+        self.nbr_msg_conversations.update(other.nbr_msg_conversations)
+        self.conversation_titles.update(other.conversation_titles)
+        self.nbr_msg_p.update(other.nbr_msg_p)
+        self.nbr_words_p.update(other.nbr_words_p)
+        self.nbr_chars_p.update(other.nbr_chars_p)
+        self.nbr_times_day.update(other.nbr_times_day)
+        if self.approximate:
+            self.words.merge(other.words)
+        else:
+            self.words.update(other.words)
+        self.emojis.update(other.emojis)
+        self.emojis_p.update(other.emojis_p)
+        self.reply_times_hist += other.reply_times_hist
+        return self
+
+    def top_conversations(self, nbr):
+        """Returns numbers of messages of `nbr` largest conversations labeled by their titles.
+
+        Conversations with the same title are labeled with their folders too.
+        """
+        top = self.nbr_msg_conversations.most_common(nbr)
+        titles = Counter(self.conversation_titles[folder] for folder, _ in top)
+        labels = {}
+        for folder, count in top:
+            title = self.conversation_titles[folder]
+            labels[title if titles[title] == 1 else '{} ({})'.format(title, folder)] = count
+        return labels
+
+    def median_reply_time(self):
+        """Returns upper bound of the histogram bin containing the median reply time.
+        """
+        if self.reply_times_hist.sum() == 0:
+            return 0.0
+        cumulative = np.cumsum(self.reply_times_hist)
+        return float(self.reply_times_bins[np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+    def generate_txt(self, path=os.path.join('results', 'inbox.txt'), nbr_top=40):
+        """Writes a report of the whole inbox.
+
+        Args:
+            path (str): Path to the output txt file.
+            nbr_top (int): Number of participants, conversations, words and emojis in top lists.
+
+        """
+        nbr_msg = sum(self.nbr_msg_p.values())
+        nbr_words = sum(self.nbr_words_p.values())
+        nbr_chars = sum(self.nbr_chars_p.values())
+        nbr_emojis = sum(self.emojis_p.values())
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        with open(path, 'w', encoding='utf8') as txt:
+            txt.write(banner('Inbox') + '\n')
+            txt.write('Number of conversations: {}\n'.format(self.nbr_conversations))
+            if self.nbr_times_day:
+                first_day, last_day = min(self.nbr_times_day), max(self.nbr_times_day)
+                nbr_days = last_day - first_day + 1
+                txt.write('Start: {}\nEnd: {}\n'.format(date.fromordinal(first_day), date.fromordinal(last_day)))
+                txt.write('Number of days: {}\n'.format(nbr_days))
+                txt.write('Number of active days: {} ({:.3} %)\n'.format(len(self.nbr_times_day), 100*len(self.nbr_times_day)/nbr_days))
+                busiest_day, busiest_day_count = self.nbr_times_day.most_common(1)[0]
+                txt.write('Most messages in one day: {} ({})\n'.format(busiest_day_count, date.fromordinal(busiest_day)))
+                txt.write('Average messages per day: {:.1f}\n'.format(nbr_msg/nbr_days))
+            txt.write('Median reply time: <{:.0f} seconds\n'.format(self.median_reply_time()))
+
+            txt.write(banner('Conversations') + '\n')
+            txt.write(get_stats(self.top_conversations(nbr_top), nbr_msg, nbr_top) + '\n')
+
+            txt.write(banner('Messages') + '\n')
+            txt.write('Number of messages: {}\n'.format(nbr_msg))
+            txt.write(get_stats(dict(self.nbr_msg_p.most_common(nbr_top)), nbr_msg, nbr_top) + '\n')
+
+            txt.write(banner('Words') + '\n')
+            txt.write('Number of words: {}\n'.format(nbr_words))
+            txt.write(get_stats(dict(self.nbr_words_p.most_common(nbr_top)), nbr_words, nbr_top) + '\n')
+
+            txt.write(banner('Characters') + '\n')
+            txt.write('Number of characters: {}\n'.format(nbr_chars))
+            txt.write(get_stats(dict(self.nbr_chars_p.most_common(nbr_top)), nbr_chars, nbr_top) + '\n')
+
+            txt.write(banner('Emojis') + '\n')
+            txt.write('Number of emojis: {}\n'.format(nbr_emojis))
+            txt.write('Top {} emojis: {}\n'.format(nbr_top, [e for e, _ in self.emojis.most_common(nbr_top)]))
+            txt.write(get_stats(dict(self.emojis_p.most_common(nbr_top)), nbr_emojis, nbr_top) + '\n')
+
+            txt.write(banner('Top words') + '\n')
+            if self.approximate:
+                txt.write('Number of distinct words: ~{}\n'.format(self.words.nbr_distinct()))
+                top_words = self.words.top(nbr_top).items()
+            else:
+                txt.write('Number of distinct words: {}\n'.format(len(self.words)))
+                top_words = self.words.most_common(nbr_top)
+            for i, (word, count) in enumerate(top_words, 1):
+                txt.write('{}. {} ({})\n'.format(i, word, count))
+
+
+def map_conversation(path_to_conversation, approximate=False):
+    """Reads one conversation and returns its partial aggregates.
+
+    Args:
+        path_to_conversation (str): Path to message_1.json of the conversation.
+        approximate (bool): Use sketches for word statistics.
+
+    Returns:
+        InboxStatistics: Statistics of the conversation, None if it can not be processed.
+
+    """
+    try:
+        conversation = FacebookMessengerConversation(path_to_conversation, approximate=approximate)
+        return InboxStatistics.from_conversation(conversation)
+    except Exception as e:
+        print('Error "{}" processing conversation: {}'.format(e, path_to_conversation))
+        return None
+
+def reduce_inbox(paths_to_conversations, max_workers=None, approximate=False):
+    """Computes statistics of many conversations in a process pool.
+
+    Args:
+        paths_to_conversations (list): Paths to message_1.json of conversations.
+        max_workers (int): Number of processes, defaults to number of CPUs.
+        approximate (bool): Use bounded memory sketches for word statistics.
+
+    Returns:
+        InboxStatistics: Statistics of all conversations.
+
+    """
+    stats = InboxStatistics(approximate)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for partial in executor.map(map_conversation, paths_to_conversations, [approximate] * len(paths_to_conversations), chunksize=4):
+            if partial is not None:
+                stats.merge(partial)
+    return stats
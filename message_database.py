@@ -0,0 +1,148 @@
+import os
+import sqlite3
+
+class MessageDatabase():
+    """SQLite database of normalized messages for ad-hoc queries.
+
+    Messages are indexed by (conversation, timestamp) and (sender, timestamp).
+
+    Attributes:
+        path (str): Path to the database file.
+        batch_size (int): Number of rows inserted with one executemany call.
+
+    """
+
+    media_kinds = ['photos', 'videos', 'gifs', 'audio_files', 'files', 'sticker', 'share']
+
+    def __init__(self, path=os.path.join('results', 'messages.db'), batch_size=10000):
+        self.path = path
+        self.batch_size = batch_size
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        media_columns = ''.join('{} INTEGER NOT NULL DEFAULT 0, '.format(kind) for kind in self.media_kinds)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS conversations (
+                id INTEGER PRIMARY KEY,
+                thread_path TEXT UNIQUE NOT NULL,
+                title TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS participants (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+                timestamp_ms INTEGER NOT NULL,
+                sender_id INTEGER NOT NULL REFERENCES participants(id),
+                content TEXT,
+                ''' + media_columns + '''
+                is_unsent INTEGER NOT NULL DEFAULT 0);
+            CREATE TABLE IF NOT EXISTS reactions (
+                message_id INTEGER NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+                actor_id INTEGER NOT NULL REFERENCES participants(id),
+                reaction TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation_timestamp ON messages (conversation_id, timestamp_ms);
+            CREATE INDEX IF NOT EXISTS idx_messages_sender_timestamp ON messages (sender_id, timestamp_ms);
+            CREATE INDEX IF NOT EXISTS idx_reactions_message ON reactions (message_id);
+            ''')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __participant_ids(self, names):
+        """Returns ids of participants, inserting the missing ones.
+
+        Args:
+            names (iterable): Names of participants.
+
+        Returns:
+            dict: Participant id by name.
+
+        """
+        names = list(dict.fromkeys(names))
+        self.connection.executemany('INSERT OR IGNORE INTO participants (name) VALUES (?)', ((name,) for name in names))
+        ids = {}
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            query = 'SELECT name, id FROM participants WHERE name IN ({})'.format(','.join('?' * len(chunk)))
+            ids.update(self.connection.execute(query, chunk))
+        return ids
+
+    def add_conversation(self, conversation):
+        """Writes all messages of `conversation`, replacing a previous export of it.
+
+        Args:
+            conversation (FacebookMessengerConversation): Conversation with
+                messages already decoded by `read_conversation`.
+
+        """
+        data = conversation.data
+        thread_path = data.get('thread_path', conversation.title)
+        messages = data['messages']
+
+        with self.connection:
+            self.connection.execute('DELETE FROM conversations WHERE thread_path = ?', (thread_path,))
+            conversation_id = self.connection.execute('INSERT INTO conversations (thread_path, title) VALUES (?, ?)',
+                                                      (thread_path, conversation.title)).lastrowid
+
+            names = [message['sender_name'] for message in messages]
+            names += [reaction['actor'] for message in messages if 'reactions' in message for reaction in message['reactions']]
+            ids = self.__participant_ids(names)
+
+            # Message ids are assigned here so reactions can reference them without a lookup
+            first_id = self.connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM messages').fetchone()[0]
+            message_rows = []
+            reaction_rows = []
+            insert_message = 'INSERT INTO messages (id, conversation_id, timestamp_ms, sender_id, content, {}, is_unsent) VALUES ({})'.format(
+                ', '.join(self.media_kinds), ', '.join('?' * (len(self.media_kinds) + 6)))
+            insert_reaction = 'INSERT INTO reactions (message_id, actor_id, reaction) VALUES (?, ?, ?)'
+            for i, message in enumerate(reversed(messages)):
+                message_id = first_id + i
+                media = [media_count(message.get(kind)) for kind in self.media_kinds]
+                message_rows.append((message_id, conversation_id, message['timestamp_ms'], ids[message['sender_name']],
+                                     message.get('content'), *media, int('is_unsent' in message)))
+                for reaction in message.get('reactions', []):
+                    reaction_rows.append((message_id, ids[reaction['actor']], reaction['reaction']))
+
+                # Reactions reference their messages, so pending messages are always written first
+                if len(message_rows) >= self.batch_size or len(reaction_rows) >= self.batch_size:
+                    self.connection.executemany(insert_message, message_rows)
+                    self.connection.executemany(insert_reaction, reaction_rows)
+                    message_rows = []
+                    reaction_rows = []
+            self.connection.executemany(insert_message, message_rows)
+            self.connection.executemany(insert_reaction, reaction_rows)
+
+    def query(self, sql, parameters=()):
+        """Runs `sql` and returns all resulting rows.
+        """
+        return self.connection.execute(sql, parameters).fetchall()
+
+    def close(self):
+        self.connection.close()
+
+
+def media_count(media):
+    """Returns number of attachments of one kind in a message.
+
+    Args:
+        media (list or dict or None): Value of the message media key.
+
+    Returns:
+        int: Number of attachments.
+
+    """
+    if media is None:
+        return 0
+    if isinstance(media, list):
+        return len(media)
+    return 1
@@ -0,0 +1,176 @@
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties, findfont, get_font
+from matplotlib.ticker import PercentFormatter
+
+class PageTemplates():
+    """Figures of PDF pages reused by all pages and conversations.
+
+    Creating a figure and computing its layout with `tight_layout` costs
+    more than drawing small charts, so one figure is kept per page kind
+    with fixed margins and only its axes content is replaced. Charts with
+    a fixed number of bars (hours, weekdays) keep their artists and only
+    update bar heights.
+
+    Attributes:
+        figsize (dict): Size of figures of every page kind in inches.
+        margins (dict): Subplot parameters of every page kind, 'legend'
+            leaves space for legends placed outside the axes.
+
+    """
+
+    figsize = {'pie': (6.4, 4.8), 'bar': (8.0, 4.8), 'legend': (8.0, 4.8), 'text': (8.27, 11.69)}
+    margins = {'pie': dict(left=0.125, right=0.9, bottom=0.11, top=0.88),
+               'bar': dict(left=0.09, right=0.97, bottom=0.12, top=0.93),
+               'legend': dict(left=0.09, right=0.83, bottom=0.12, top=0.83),
+               'text': dict(left=0.125, right=0.9, bottom=0.11, top=0.88)}
+
+    def __init__(self):
+        self.__figures = {}
+        self.__fixed = {}
+
+    def page(self, kind):
+        """Returns (figure, axes) of page `kind` with empty axes.
+        """
+        if kind not in self.__figures:
+            fig = Figure(figsize=self.figsize[kind])
+            self.__figures[kind] = (fig, fig.add_subplot())
+        fig, ax = self.__figures[kind]
+        ax.clear()
+        ax.set_axis_on()
+        for spine in ax.spines.values():
+            spine.set_visible(True)
+            spine.set_linewidth(rcParams['axes.linewidth'])
+        fig.subplots_adjust(**self.margins[kind])
+        return fig, ax
+
+    def fixed_bars(self, key, heights, setup):
+        """Returns figure of bar chart `key` with bars updated to `heights`.
+
+        Args:
+            key (str): Name of the chart.
+            heights (list): Heights of the bars.
+            setup (function): Draws the chart on axes given as argument
+                on first use and returns its bars.
+
+        """
+        if key not in self.__fixed:
+            fig = Figure(figsize=self.figsize['bar'])
+            ax = fig.add_subplot()
+            fig.subplots_adjust(**self.margins['bar'])
+            self.__fixed[key] = (fig, ax, setup(ax))
+        fig, ax, bars = self.__fixed[key]
+        for bar, height in zip(bars, heights):
+            bar.set_height(height)
+        ax.relim()
+        ax.autoscale_view()
+        return fig
+
+    def text_page(self, title=None):
+        """Returns (figure, axes) of a text page without axis.
+        """
+        fig, ax = self.page('text')
+        ax.axis('off')
+        if title is not None:
+            ax.set_title(title, fontsize=16, fontweight='bold')
+        return fig, ax
+
+
+def style_axes(ax):
+    """Dashed horizontal grid and thin left and bottom spines.
+    """
+    ax.yaxis.grid(linestyle='--')
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    ax.spines['bottom'].set_linewidth(0.5)
+    ax.spines['left'].set_linewidth(0.5)
+
+def percent_axis(ax):
+    ax.yaxis.set_major_formatter(PercentFormatter(1.0, decimals=0))
+
+def text_block(ax, x, y, lines, fontsize=12, step=0.025):
+    """Draws `lines` as one text from `y` downwards, `step` apart in axes coordinates.
+
+    The first line is centered at `y`. Every line of a text with fixed
+    `linespacing` is `linespacing` times the font height tall, so it is
+    chosen to make lines `step` apart.
+    """
+    prop = FontProperties(size=fontsize)
+    step_points = step * ax.get_position().height * ax.figure.get_figheight() * 72
+    ax.text(x, y + step / 2, '\n'.join(lines), fontproperties=prop, linespacing=step_points / font_height(prop),
+            verticalalignment='top', transform=ax.transAxes)
+
+def font_height(prop):
+    """Returns ascent plus descent of the font of `prop` in points, as used to space lines of text.
+    """
+    font = get_font(findfont(prop))
+    scale = prop.get_size_in_points() / font.get_sfnt_table('head')['unitsPerEm']
+    for table_name, ascent_key, descent_key in [('OS/2', 'sTypoAscender', 'sTypoDescender'), ('hhea', 'ascent', 'descent')]:
+        table = font.get_sfnt_table(table_name)
+        if table is not None:
+            return (table[ascent_key] - table[descent_key]) * scale
+    return prop.get_size_in_points() * 1.2
+
+def timeline_bins(timeline, max_points):
+    """Splits days of `timeline` into days, weeks (from Monday) or months so there are at most `max_points` bins.
+
+    Returns:
+        tuple: Index of the first day of every bin and name of the bin
+            ('day', 'week', 'month' or 'year').
+
+    """
+    days = len(timeline)
+    if days <= max_points:
+        return np.arange(days), 'day'
+    for name, starts_bin in [('week', lambda day: day.weekday() == 0),
+                             ('month', lambda day: day.day == 1),
+                             ('year', lambda day: day.month == 1 and day.day == 1)]:
+        starts = np.array([0] + [i for i, day in enumerate(timeline) if i and starts_bin(day)])
+        if len(starts) <= max_points or name == 'year':
+            return starts, name
+
+def bin_means(values, starts):
+    """Returns the mean of `values` in every bin starting at `starts`.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lengths = np.diff(np.append(starts, len(values)))
+    return np.add.reduceat(values, starts, axis=-1) / lengths
+
+def lttb(values, max_points):
+    """Downsamples a line with Largest-Triangle-Three-Buckets keeping its peaks.
+
+    Args:
+        values (list): Value of the line at every day.
+        max_points (int): Maximum number of points kept.
+
+    Returns:
+        numpy.ndarray: Sorted indices of the kept days, always including
+            the first and the last one.
+
+    """
+    y = np.asarray(values, dtype=np.float64)
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average point of the next bucket is the third vertex of the triangles
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = (next_lo + next_hi - 1) / 2
+        avg_y = y[next_lo:next_hi].mean()
+        x = np.arange(lo, hi)
+        areas = np.abs((a - avg_x) * (y[lo:hi] - y[a]) - (a - x) * (avg_y - y[a]))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+def plot_downsampled(ax, timeline, values, max_points, **kwargs):
+    """Plots a line over `timeline` with at most `max_points` points kept by `lttb`.
+    """
+    keep = lttb(values, max_points)
+    return ax.plot([timeline[i] for i in keep], np.asarray(values)[keep], **kwargs)
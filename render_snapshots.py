@@ -0,0 +1,51 @@
+import sys
+import os
+from facebook_chat_statistics import FacebookChatStatistics
+import time
+
+def render_snapshot(path_to_snapshot, pdf=False, txt=False, html=False):
+    try:
+        fcs = FacebookChatStatistics.load_snapshot(path_to_snapshot)
+        if pdf:
+            fcs.generate_pdf()
+        if txt:
+            fcs.generate_txt()
+        if html:
+            fcs.generate_html()
+        print('{} Rendered!'.format(fcs.title))
+    except Exception as e:
+        print('Error "{}" rendering snapshot: {}'.format(e, path_to_snapshot))
+
+def main():
+    """
+    Renders reports from snapshots saved by `analize_entire_folder.py`
+    with the snapshot option, without reading the conversations again.
+    """
+    if len(sys.argv) >= 2:
+        path_to_snapshots = str(sys.argv[1])
+        pdf = 'pdf' in sys.argv[2:]
+        txt = 'txt' in sys.argv[2:]
+        html = 'html' in sys.argv[2:]
+    else:
+        print('Usage: python3 {} path/to/snapshots [pdf] [txt] [html]'.format(sys.argv[0]))
+        sys.exit()
+
+    if os.path.isfile(path_to_snapshots):
+        snapshots = [path_to_snapshots]
+    elif os.path.isdir(path_to_snapshots):
+        snapshots = [os.path.join(path_to_snapshots, f) for f in sorted(os.listdir(path_to_snapshots)) if f.endswith('.snapshot')]
+    else:
+        print('Invalid snapshot path')
+        sys.exit()
+
+    start_time = time.time()
+
+    if not os.path.exists('results'):
+        os.makedirs('results')
+    for snapshot in snapshots:
+        render_snapshot(snapshot, pdf, txt, html)
+
+    print('\nExecution time: {:.2f} seconds'.format(time.time() - start_time))
+
+if __name__ == '__main__':
+    main()
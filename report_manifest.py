@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+
+class ReportManifest():
+    """Manifest of generated reports used to skip conversations that did not change.
+
+    For every conversation it records the fingerprint of its part files,
+    the configuration and the code version the outputs were generated with.
+    Outputs are valid while all of them match and the outputs exist.
+
+    Attributes:
+        path (str): Path to the manifest JSON file.
+        code_version (str): Hash of the modules generating reports.
+
+    """
+
+    # Modules whose changes can change generated reports
+    code_modules = ['facebook_messenger_conversation.py', 'facebook_chat_statistics.py', 'page_templates.py', 'html_report.py', 'sketches.py', 'export_archive.py',
+                    'message_database.py', 'user_statistics_store.py', 'analize_entire_folder.py']
+
+    def __init__(self, path=os.path.join('results', 'manifest.json')):
+        self.path = path
+        self.code_version = code_version(self.code_modules)
+        self.entries = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                print('Manifest {} is corrupted, all reports will be generated'.format(path))
+
+    def fingerprint(self, folder_path):
+        """Returns names, sizes, modification times and hashes of conversation parts in `folder_path`.
+
+        Parts with the same size and modification time as in the manifest
+        are not hashed again.
+        """
+        key = os.path.abspath(folder_path)
+        known = {part['name']: part for part in self.entries.get(key, {}).get('inputs', [])}
+        parts = []
+        for name in sorted(f for f in os.listdir(folder_path) if f.startswith('message_') and f.endswith('.json')):
+            stat = os.stat(os.path.join(folder_path, name))
+            part = {'name': name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            previous = known.get(name)
+            if previous is not None and previous['size'] == part['size'] and previous['mtime_ns'] == part['mtime_ns']:
+                part['hash'] = previous['hash']
+            else:
+                part['hash'] = file_hash(os.path.join(folder_path, name))
+            parts.append(part)
+        return parts
+
+    def fingerprint_members(self, members):
+        """Returns names, sizes and CRC-32 of conversation parts stored in an export archive.
+
+        Archives store a checksum of every member, so parts are not read.
+        """
+        return [{'name': member.name, 'size': member.info().file_size, 'hash': '{:08x}'.format(member.info().CRC)} for member in members]
+
+    def is_current(self, folder_path, inputs, config):
+        """Returns True if outputs of `folder_path` were generated from the same inputs, configuration and code.
+        """
+        entry = self.entries.get(os.path.abspath(folder_path))
+        if entry is None or entry['code_version'] != self.code_version or entry['config'] != config:
+            return False
+        if [part['hash'] for part in entry['inputs']] != [part['hash'] for part in inputs]:
+            return False
+        return all(os.path.isfile(output) for output in entry['outputs'])
+
+    def update(self, folder_path, inputs, config, outputs):
+        self.entries[os.path.abspath(folder_path)] = {'inputs': inputs, 'config': config,
+                                                      'code_version': self.code_version, 'outputs': outputs}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first, an interrupted run must not corrupt the manifest
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """Returns blake2b hash of the file at `path`.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def code_version(modules):
+    """Returns hash of source files `modules` next to this file.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for module in modules:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
@@ -0,0 +1,219 @@
+import hashlib
+import heapq
+import math
+import numpy as np
+
+def hash64(item):
+    """Returns a 64-bit hash of `item`, stable between processes.
+
+    Args:
+        item (str): Item to hash.
+
+    Returns:
+        int: Unsigned 64-bit hash.
+
+    """
+    return int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class CountMinSketch():
+    """Count-Min Sketch estimating counts of items in fixed memory.
+
+    Estimates never underestimate and overestimate by at most
+    `epsilon` * total count with probability 1 - `delta`.
+
+    """
+
+    def __init__(self, epsilon=0.0001, delta=0.01):
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = int(math.ceil(math.e / epsilon))
+        self.depth = int(math.ceil(math.log(1 / delta)))
+        self.table = np.zeros((self.depth, self.width), dtype=np.int64)
+        self.total = 0
+
+    def __columns(self, hashes):
+        # Double hashing, row i uses h1 + i * h2
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1 = (hashes & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        h2 = (hashes >> np.uint64(32)).astype(np.int64)
+        return (h1[None, :] + np.arange(self.depth)[:, None] * h2[None, :]) % self.width
+
+    def add_hashes(self, hashes, counts):
+        """Adds `counts` of items with precomputed `hashes`.
+        """
+        if len(hashes) == 0:
+            return
+        counts = np.asarray(counts, dtype=np.int64)
+        columns = self.__columns(hashes)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], counts)
+        self.total += int(counts.sum())
+
+    def estimate_hashes(self, hashes):
+        """Returns estimated counts of items with precomputed `hashes`.
+        """
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        columns = self.__columns(hashes)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def estimate(self, item):
+        return int(self.estimate_hashes([hash64(item)])[0])
+
+    def merge(self, other):
+        if self.table.shape != other.table.shape:
+            raise ValueError('Count-Min Sketches with different dimensions can not be merged')
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class SpaceSaving():
+    """Space-Saving summary keeping `capacity` most frequent items (heavy hitters).
+
+    Counts of kept items are overestimated by at most the smallest kept count.
+
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.counts = {}
+        self.__heap = []
+
+    def __min_item(self):
+        # Heap entries are lazily invalidated, skip the ones with outdated counts
+        while self.__heap[0][0] != self.counts.get(self.__heap[0][1]):
+            heapq.heappop(self.__heap)
+        return self.__heap[0]
+
+    def add(self, item, count=1):
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+        else:
+            min_count, min_item = self.__min_item()
+            del self.counts[min_item]
+            self.counts[item] = min_count + count
+        heapq.heappush(self.__heap, (self.counts[item], item))
+        if len(self.__heap) > 4 * self.capacity:
+            self.__heap = [(c, i) for i, c in self.counts.items()]
+            heapq.heapify(self.__heap)
+
+    def top(self, nbr):
+        """Returns `nbr` most frequent items with their estimated counts, sorted like exact statistics.
+        """
+        return sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))[:nbr]
+
+    def missing_count(self):
+        """Returns the largest possible count of an item that is not kept.
+        """
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other):
+        """Merges `other` into this summary, counts stay upper bounds of the true counts.
+
+        An item missing from a full summary may have occurred up to its
+        smallest kept count, so it is added for every missing item.
+        """
+        missing, other_missing = self.missing_count(), other.missing_count()
+        counts = {item: count + other.counts.get(item, other_missing) for item, count in self.counts.items()}
+        for item, count in other.counts.items():
+            if item not in counts:
+                counts[item] = count + missing
+        self.counts = dict(sorted(counts.items(), key=lambda kv: -kv[1])[:self.capacity])
+        self.__heap = [(c, i) for i, c in self.counts.items()]
+        heapq.heapify(self.__heap)
+        return self
+
+
+class HyperLogLog():
+    """HyperLogLog estimating number of distinct items, relative error about 1.04 / sqrt(2 ** `precision`).
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """Adds items with precomputed 64-bit `hashes`.
+        """
+        bits = 64 - self.precision
+        mask = (1 << bits) - 1
+        if len(hashes) == 0:
+            return
+        indexes = np.array([h >> bits for h in hashes], dtype=np.int64)
+        ranks = np.array([bits - (h & mask).bit_length() + 1 for h in hashes], dtype=np.uint8)
+        np.maximum.at(self.registers, indexes, ranks)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros) # Linear counting for small cardinalities
+        return int(round(estimate))
+
+    def merge(self, other):
+        if self.precision != other.precision:
+            raise ValueError('HyperLogLogs with different precision can not be merged')
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+
+class WordSketch():
+    """Mergeable approximate statistics of a stream of words.
+
+    Combines Space-Saving for top words, Count-Min Sketch for their counts
+    and HyperLogLog for number of distinct words.
+
+    Attributes:
+        heavy_hitters (SpaceSaving): Candidates for top words.
+        count_min (CountMinSketch): Count estimates, None if disabled.
+        distinct (HyperLogLog): Distinct words estimate.
+
+    """
+
+    def __init__(self, epsilon=0.0001, delta=0.01, capacity=1000, precision=14, count_min=True):
+        self.heavy_hitters = SpaceSaving(capacity)
+        self.count_min = CountMinSketch(epsilon, delta) if count_min else None
+        self.distinct = HyperLogLog(precision)
+
+    def update(self, counts):
+        """Adds a batch of words.
+
+        Args:
+            counts (dict): Number of occurrences of every word in the batch.
+
+        """
+        hashes = [hash64(word) for word in counts]
+        if self.count_min is not None:
+            self.count_min.add_hashes(hashes, list(counts.values()))
+        self.distinct.add_hashes(hashes)
+        for word, count in counts.items():
+            self.heavy_hitters.add(word, count)
+
+    def top(self, nbr):
+        """Returns dict of `nbr` most frequent words with their estimated counts.
+        """
+        top = self.heavy_hitters.top(nbr)
+        if self.count_min is not None and top:
+            # Both estimates are upper bounds, the smaller one is closer
+            estimates = self.count_min.estimate_hashes([hash64(word) for word, _ in top])
+            top = [(word, min(count, int(estimate))) for (word, count), estimate in zip(top, estimates)]
+            top.sort(key=lambda kv: (-kv[1], kv[0]))
+        return dict(top)
+
+    def nbr_distinct(self):
+        return self.distinct.estimate()
+
+    def merge(self, other):
+        self.heavy_hitters.merge(other.heavy_hitters)
+        if self.count_min is not None and other.count_min is not None:
+            self.count_min.merge(other.count_min)
+        else:
+            self.count_min = None
+        self.distinct.merge(other.distinct)
+        return self
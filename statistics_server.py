@@ -0,0 +1,277 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+import numpy as np
+from facebook_chat_statistics import FacebookChatStatistics
+
+# pyplot keeps global state, PDFs of different conversations are rendered one at a time
+_pdf_lock = threading.Lock()
+
+class CachedConversation():
+    """Computed conversation kept in memory together with its rendered outputs.
+
+    Attributes:
+        statistics (FacebookChatStatistics): Computed conversation.
+        signature (tuple): (path, mtime, size) of every part when it was loaded.
+        size (int): Estimated memory used by the conversation in bytes.
+        outputs (dict): Rendered reports by format, e.g. 'txt', 'pdf'.
+
+    """
+
+    def __init__(self, statistics, signature):
+        self.statistics = statistics
+        self.signature = signature
+        self.size = estimate_size(statistics, signature)
+        self.outputs = {}
+        self.lock = threading.Lock()
+
+    def output(self, kind):
+        """Returns report `kind` ('txt' or 'pdf'), rendering it on first use.
+
+        Reports are rendered to a private temporary directory, conversations
+        with the same title would overwrite each other's files in results.
+        """
+        with self.lock:
+            if kind not in self.outputs:
+                with tempfile.TemporaryDirectory() as directory:
+                    path = os.path.join(directory, 'report.' + kind)
+                    if kind == 'pdf':
+                        with _pdf_lock:
+                            self.statistics.generate_pdf(path=path)
+                    else:
+                        self.statistics.generate_txt(path=path)
+                    with open(path, 'rb') as f:
+                        self.outputs[kind] = f.read()
+                self.size += len(self.outputs[kind])
+            return self.outputs[kind]
+
+
+class ConversationCache():
+    """LRU cache of computed conversations limited by their estimated memory.
+
+    Conversations are reloaded when any of their part files changes.
+
+    Attributes:
+        max_memory (int): Memory budget in bytes, least recently used
+            conversations are evicted above it.
+        approximate (bool): Compute conversations in approximate mode.
+
+    """
+
+    def __init__(self, max_memory=2 * 1024 ** 3, approximate=False):
+        self.max_memory = max_memory
+        self.approximate = approximate
+        self.__entries = OrderedDict()
+        self.__loading = {}
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path_to_conversation):
+        """Returns the cached conversation, loading it if missing or outdated.
+
+        Args:
+            path_to_conversation (str): Path to message_1.json of the conversation.
+
+        Returns:
+            CachedConversation: Conversation with its rendered outputs.
+
+        """
+        key = os.path.abspath(path_to_conversation)
+        signature = parts_signature(key)
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            loading = self.__loading.setdefault(key, threading.Lock())
+
+        # Only one thread loads a conversation, the others wait and reuse it
+        with loading:
+            with self.__lock:
+                entry = self.__entries.get(key)
+                if entry is not None and entry.signature == signature:
+                    self.__entries.move_to_end(key)
+                    return entry
+            entry = CachedConversation(FacebookChatStatistics(key, self.approximate), signature)
+            with self.__lock:
+                self.__entries[key] = entry
+                self.__entries.move_to_end(key)
+                self.__loading.pop(key, None)
+                self.__evict()
+        return entry
+
+    def __evict(self):
+        # The most recently used conversation is kept even if it alone exceeds the budget
+        while len(self.__entries) > 1 and self.memory() > self.max_memory:
+            self.__entries.popitem(last=False)
+
+    def memory(self):
+        """Returns estimated memory used by cached conversations in bytes.
+        """
+        return sum(entry.size for entry in self.__entries.values())
+
+    def info(self):
+        with self.__lock:
+            return {'conversations': [entry.statistics.title for entry in self.__entries.values()],
+                    'memory': self.memory(),
+                    'max_memory': self.max_memory,
+                    'hits': self.hits,
+                    'misses': self.misses}
+
+
+class StatisticsRequestHandler(BaseHTTPRequestHandler):
+    """Serves statistics of conversations in `server.inbox`.
+
+    Routes:
+        /                              Conversation folders as JSON.
+        /cache                         Cache usage as JSON.
+        /<folder>/txt                  txt report.
+        /<folder>/pdf                  PDF report.
+        /<folder>/json?start=&end=     Statistics of a date range as JSON.
+        /<folder>/json?user=Name       User statistics as JSON.
+
+    """
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        route = [unquote(part) for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if not route:
+                self.send_json(self.server.conversations())
+            elif route == ['cache']:
+                self.send_json(self.server.cache.info())
+            elif len(route) == 2 and route[1] in ('txt', 'pdf', 'json'):
+                path = self.server.conversation_path(route[0])
+                if path is None:
+                    self.send_error(404, 'Conversation not found')
+                    return
+                entry = self.server.cache.get(path)
+                if route[1] == 'txt':
+                    self.send(entry.output('txt'), 'text/plain; charset=utf-8')
+                elif route[1] == 'pdf':
+                    self.send(entry.output('pdf'), 'application/pdf')
+                elif 'user' in query:
+                    user = query['user'].replace('_', ' ')
+                    if user not in entry.statistics.p:
+                        self.send_error(404, 'User not found')
+                        return
+                    self.send_json(entry.statistics.get_user_statistics(user))
+                else:
+                    try:
+                        statistics = entry.statistics.range_statistics(query.get('start'), query.get('end'))
+                    except ValueError:
+                        self.send_error(400, 'Invalid date, expected YYYY-MM-DD')
+                        return
+                    self.send_json(statistics)
+            else:
+                self.send_error(404)
+        except Exception as e:
+            # The message of the error is sent in the latin-1 status line, so the exception is only logged
+            print('Error "{}" processing request: {}'.format(e, self.path), file=sys.stderr)
+            self.send_error(500, 'Internal server error')
+
+    def send_json(self, data):
+        self.send(json.dumps(data, ensure_ascii=False, default=to_json).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def send(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class StatisticsServer(ThreadingHTTPServer):
+    """Local HTTP server keeping conversations of an inbox folder in memory.
+
+    Attributes:
+        inbox (str): Folder with one subfolder per conversation.
+        cache (ConversationCache): Computed conversations.
+        quiet (bool): Do not log requests.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, inbox, port=8000, cache=None, quiet=False):
+        super().__init__(('127.0.0.1', port), StatisticsRequestHandler)
+        self.inbox = os.path.abspath(inbox)
+        self.cache = cache if cache is not None else ConversationCache()
+        self.quiet = quiet
+
+    def conversations(self):
+        return sorted(f for f in os.listdir(self.inbox) if os.path.isfile(os.path.join(self.inbox, f, 'message_1.json')))
+
+    def conversation_path(self, folder):
+        """Returns path to message_1.json of `folder`, None if it is not a conversation of the inbox.
+        """
+        path = os.path.join(self.inbox, folder, 'message_1.json')
+        if os.path.dirname(os.path.dirname(os.path.abspath(path))) != self.inbox or not os.path.isfile(path):
+            return None
+        return path
+
+
+def parts_signature(path_to_conversation):
+    """Returns (path, mtime, size) of every part of a conversation.
+    """
+    directory = os.path.dirname(path_to_conversation)
+    parts = sorted(f for f in os.listdir(directory) if f.startswith('message_') and f.endswith('.json'))
+    signature = []
+    for part in parts:
+        stat = os.stat(os.path.join(directory, part))
+        signature.append((part, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def estimate_size(conversation, signature):
+    """Returns estimated memory used by a computed conversation in bytes.
+
+    Arrays are counted exactly, decoded messages are estimated from the
+    size of the JSON files (Python objects take a few times more memory).
+    """
+    arrays = sum(value.nbytes for value in vars(conversation).values() if isinstance(value, np.ndarray))
+    return arrays + 4 * sum(size for _, _, size in signature)
+
+def to_json(value):
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError('{} is not JSON serializable'.format(type(value).__name__))
+
+def main():
+    if len(sys.argv) < 2 or not os.path.isdir(sys.argv[1]):
+        print('Usage: python3 {} path/to/inbox [port] [memory_MB] [approx]'.format(sys.argv[0]))
+        sys.exit()
+    arguments = [a for a in sys.argv[2:] if a != 'approx']
+    port = int(arguments[0]) if len(arguments) >= 1 else 8000
+    max_memory = int(arguments[1]) * 1024 ** 2 if len(arguments) >= 2 else 2 * 1024 ** 3
+
+    cache = ConversationCache(max_memory, approximate='approx' in sys.argv[2:])
+    server = StatisticsServer(sys.argv[1], port, cache)
+    print('Serving statistics of {} on http://127.0.0.1:{}/'.format(server.inbox, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
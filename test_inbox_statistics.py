@@ -0,0 +1,21 @@
+import json
+import os
+
+from inbox_statistics import InboxStatistics, map_conversation
+
+def write_conversation(directory, sender, nbr_messages):
+    os.makedirs(directory)
+    messages = [{'sender_name': sender, 'timestamp_ms': 1600000000000 - i * 60000, 'content': 'message {}'.format(i)}
+                for i in range(nbr_messages)]
+    data = {'participants': [{'name': sender}], 'messages': messages, 'title': 'Same title', 'magic_words': []}
+    path = os.path.join(directory, 'message_1.json')
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    return path
+
+def test_conversations_with_the_same_title_are_counted_separately(tmp_path):
+    inbox = InboxStatistics()
+    inbox.merge(map_conversation(write_conversation(str(tmp_path / 'a'), 'Anna', 100)))
+    inbox.merge(map_conversation(write_conversation(str(tmp_path / 'b'), 'Jan', 200)))
+    assert inbox.nbr_msg_conversations == {'a': 100, 'b': 200}
+    assert inbox.top_conversations(10) == {'Same title (b)': 200, 'Same title (a)': 100}
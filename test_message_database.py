@@ -0,0 +1,25 @@
+import json
+
+from facebook_messenger_conversation import FacebookMessengerConversation
+from message_database import MessageDatabase
+
+def write_conversation(path, nbr_messages=3000):
+    """Writes a conversation of two participants who both react to every message."""
+    messages = []
+    for i in range(nbr_messages):
+        message = {'sender_name': ['Anna', 'Jan'][i % 2], 'timestamp_ms': 1600000000000 - i * 60000, 'content': 'message {}'.format(i)}
+        message['reactions'] = [{'reaction': 'x', 'actor': 'Anna'}, {'reaction': 'y', 'actor': 'Jan'}]
+        messages.append(message)
+    data = {'participants': [{'name': 'Anna'}, {'name': 'Jan'}], 'messages': messages,
+            'title': 'Test', 'thread_path': 'inbox/test', 'magic_words': []}
+    path.write_text(json.dumps(data))
+    return str(path)
+
+def test_small_batches_write_messages_before_their_reactions(tmp_path):
+    conversation = FacebookMessengerConversation(write_conversation(tmp_path / 'message_1.json'))
+    with MessageDatabase(str(tmp_path / 'messages.db'), batch_size=5) as database:
+        database.add_conversation(conversation)
+        assert database.query('SELECT COUNT(*) FROM messages') == [(3000,)]
+        assert database.query('SELECT COUNT(*) FROM reactions') == [(6000,)]
+        assert database.query('SELECT COUNT(*) FROM reactions LEFT JOIN messages ON messages.id = message_id '
+                              'WHERE messages.id IS NULL') == [(0,)]
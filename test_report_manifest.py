@@ -0,0 +1,30 @@
+import json
+import os
+
+from analize_entire_folder import process_folder
+from report_manifest import ReportManifest
+
+def write_conversation(directory, sender, nbr_messages):
+    os.makedirs(directory)
+    messages = [{'sender_name': sender, 'timestamp_ms': 1600000000000 - i * 60000, 'content': 'message {}'.format(i)}
+                for i in range(nbr_messages)]
+    data = {'participants': [{'name': sender}], 'messages': messages, 'title': 'Same title', 'magic_words': []}
+    with open(os.path.join(directory, 'message_1.json'), 'w') as f:
+        json.dump(data, f)
+    return directory
+
+def test_conversations_with_the_same_title_have_their_own_outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    folders = [write_conversation(str(tmp_path / 'inbox' / 'a'), 'Anna', 100),
+               write_conversation(str(tmp_path / 'inbox' / 'b'), 'Jan', 200)]
+    manifest = ReportManifest()
+    config = {'pdf': False, 'txt': True, 'html': False, 'user': None, 'db': False, 'approximate': False, 'snapshot': False,
+              'transcript': True, 'chronological': False, 'compression': 'gzip'}
+    for folder in folders:
+        process_folder(folder, txt=True, manifest=manifest, transcript=True, compression='gzip')
+
+    outputs = [sorted(manifest.entries[os.path.abspath(folder)]['outputs']) for folder in folders]
+    assert outputs == [[os.path.join('results', 'Same title ({}).txt'.format(name)),
+                        os.path.join('results', 'Same title ({})_conversation.txt.gz'.format(name))] for name in 'ab']
+    for folder in folders:
+        assert manifest.is_current(folder, manifest.fingerprint(folder), config)
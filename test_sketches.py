@@ -0,0 +1,55 @@
+import random
+from collections import Counter
+
+from sketches import SpaceSaving, WordSketch
+
+def zipf_stream(seed, length=20000, vocabulary=2000):
+    rng = random.Random(seed)
+    # Ranks are rotated by the seed, so the most frequent words differ between streams
+    words = ['w{}'.format((i + 30 * seed) % vocabulary) for i in range(vocabulary)]
+    weights = [1 / (i + 1) for i in range(vocabulary)]
+    return rng.choices(words, weights, k=length)
+
+def summary(stream, capacity):
+    space_saving = SpaceSaving(capacity)
+    for item in stream:
+        space_saving.add(item)
+    return space_saving
+
+def test_merge_of_full_summaries_adds_their_minimum_to_missing_items():
+    merged = SpaceSaving(2)
+    merged.counts = {'x': 10, 'z': 17}
+    other = SpaceSaving(2)
+    other.counts = {'p': 20, 'q': 29}
+    merged.merge(other)
+    assert merged.counts == {'q': 39, 'z': 37}
+
+def test_merged_counts_are_upper_bounds_and_keep_heavy_hitters():
+    streams = [zipf_stream(seed) for seed in range(4)]
+    exact = Counter(item for stream in streams for item in stream)
+    capacity = 50
+    merged = summary(streams[0], capacity)
+    for stream in streams[1:]:
+        merged.merge(summary(stream, capacity))
+
+    for item, count in merged.counts.items():
+        assert count >= exact[item]
+    total = sum(exact.values())
+    for item, count in exact.items():
+        if count > total / capacity:
+            assert item in merged.counts
+
+def test_word_sketch_top_does_not_undercount_after_merge():
+    streams = [zipf_stream(seed) for seed in range(4)]
+    exact = Counter(item for stream in streams for item in stream)
+    merged = WordSketch(capacity=50)
+    merged.update(Counter(streams[0]))
+    for stream in streams[1:]:
+        sketch = WordSketch(capacity=50)
+        sketch.update(Counter(stream))
+        merged.merge(sketch)
+
+    top = merged.top(10)
+    for word, count in top.items():
+        assert count >= exact[word]
+    assert list(top)[:3] == [word for word, _ in exact.most_common(3)]
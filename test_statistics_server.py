@@ -0,0 +1,60 @@
+import json
+import os
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from statistics_server import ConversationCache, StatisticsServer
+
+def write_conversation(directory, sender, nbr_messages):
+    os.makedirs(directory)
+    messages = [{'sender_name': sender, 'timestamp_ms': 1600000000000 - i * 60000, 'content': 'message {}'.format(i)}
+                for i in range(nbr_messages)]
+    data = {'participants': [{'name': sender}], 'messages': messages, 'title': 'Same title', 'magic_words': []}
+    path = os.path.join(directory, 'message_1.json')
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    return path
+
+def test_conversations_with_the_same_title_keep_their_own_reports(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    cache = ConversationCache()
+    entries = [cache.get(write_conversation(str(tmp_path / 'a'), 'Anna', 100)),
+               cache.get(write_conversation(str(tmp_path / 'b'), 'Jan', 200))]
+    reports = {}
+    threads = [threading.Thread(target=lambda i=i: reports.__setitem__(i, entries[i].output('txt'))) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert b'Anna' in reports[0] and b'Jan' not in reports[0]
+    assert b'Jan' in reports[1] and b'Anna' not in reports[1]
+    assert not os.path.exists('results')
+
+@pytest.fixture
+def server(tmp_path):
+    write_conversation(str(tmp_path / 'inbox' / 'a'), 'Anna', 100)
+    server = StatisticsServer(str(tmp_path / 'inbox'), 0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+def status(url):
+    try:
+        with urlopen(url, timeout=30) as response:
+            return response.status
+    except HTTPError as e:
+        return e.code
+
+def test_unknown_user_with_non_ascii_name_is_not_found(server):
+    assert status(server + '/a/json?user=Anna') == 200
+    assert status(server + '/a/json?user=Nobody%C5%81') == 404
+
+def test_invalid_date_is_a_bad_request(server):
+    assert status(server + '/a/json?start=2020-01-01') == 200
+    assert status(server + '/a/json?start=2020-13-01') == 400
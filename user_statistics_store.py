@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import sys
+
+class UserStatisticsStore():
+    """SQLite store of user statistics, one row per (user, conversation).
+
+    Rows are buffered and written in batched transactions. The database runs
+    in WAL mode so multiple processes can write to it at the same time.
+
+    Attributes:
+        path (str): Path to the database file.
+        batch_size (int): Number of buffered rows written in one transaction.
+
+    """
+
+    def __init__(self, path=os.path.join('results', 'user_statistics.db'), batch_size=100):
+        self.path = path
+        self.batch_size = batch_size
+        self.__pending = []
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS user_statistics (
+                                        user TEXT NOT NULL,
+                                        conversation TEXT NOT NULL,
+                                        statistics TEXT NOT NULL,
+                                        PRIMARY KEY (user, conversation))''')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def update(self, user, conversation, statistics):
+        """Buffers statistics of `user` in `conversation`, replacing previous ones.
+
+        Args:
+            user (str): Name of the user.
+            conversation (str): Title of the conversation.
+            statistics (dict): Statistics to store.
+
+        """
+        self.__pending.append((user, conversation, json.dumps(statistics, ensure_ascii=False, separators=(',', ':'))))
+        if len(self.__pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes all buffered rows in a single transaction.
+        """
+        if not self.__pending:
+            return
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO user_statistics (user, conversation, statistics) VALUES (?, ?, ?)', self.__pending)
+        self.__pending = []
+
+    def get(self, user):
+        """Returns statistics of all conversations of `user`.
+
+        Args:
+            user (str): Name of the user.
+
+        Returns:
+            dict: Statistics by conversation title.
+
+        """
+        self.flush()
+        rows = self.connection.execute('SELECT conversation, statistics FROM user_statistics WHERE user = ? ORDER BY rowid', (user,))
+        return {conversation: json.loads(statistics) for conversation, statistics in rows}
+
+    def users(self):
+        """Returns names of all users in the store.
+        """
+        self.flush()
+        return [user for user, in self.connection.execute('SELECT DISTINCT user FROM user_statistics ORDER BY user')]
+
+    def export_json(self, user, path=os.path.join('results', 'user_statistics.json')):
+        """Regenerates the user statistics JSON file from the store.
+
+        Args:
+            user (str): Name of the user.
+            path (str): Path to the output JSON file.
+
+        """
+        with open(path, 'w', encoding='utf-8') as json_file:
+            json.dump({'conversations': self.get(user)}, json_file, indent=2)
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == 'export':
+        with UserStatisticsStore() as store:
+            if len(sys.argv) >= 3:
+                users = [str(sys.argv[2]).replace('_', ' ')]
+            else:
+                users = store.users()
+            if len(users) != 1:
+                print('Specify user, stored users: {}'.format(users))
+                sys.exit()
+            store.export_json(users[0])
+            print('User statistics of {} exported'.format(users[0]))
+    else:
+        print('Usage: python3 {} export [user_name]'.format(sys.argv[0]))
+
+if __name__ == '__main__':
+    main()